@@ -0,0 +1,301 @@
+"""
+Mykyta S.
+benchmark.py
+
+A script that measures the hot paths of the game on every map in the levels
+folder and on large generated maps: enemy path finding (A* and hierarchical),
+entity updates and drawing of the grid and the entities. Each one runs for a
+number of ticks and the ticks per second, median and 99th percentile tick
+times and the peak memory allocated are written to a JSON file so that
+results of different commits can be compared.
+
+It can also compare the original breadth first search to the A* search and
+check that both of them find paths of the same length.
+
+Usage: python benchmark.py [--ticks N] [--output file] [--compare-search]
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame
+
+# My own modules
+import grid_world
+import pathfinding
+import directions
+from sprite_registry import SpriteRegistry
+from hierarchical_pathfinding import ClusterGraph
+from camera import Camera
+
+# The largest view of the game in tiles, drawn by the drawing benchmarks
+VIEW_TILES = 20, 12
+
+
+# Returns every position on the map that an enemy can stand on
+def open_positions(grid):
+    return [(row, column) for row in range(grid.height)
+            for column in range(grid.width)
+            if pathfinding.can_pass_through(grid, (row, column))]
+
+
+# Picks start and end positions for the searches on a map: every open tile
+# paired with the player's spawn and with a tile on the opposite side
+def search_pairs(grid):
+    positions = open_positions(grid)
+    player_pos = round(grid.player.row), round(grid.player.column)
+    pairs = []
+    for i, position in enumerate(positions):
+        pairs.append((position, player_pos))
+        pairs.append((position, positions[-1 - i]))
+    return pairs
+
+
+# Runs the search function on every pair and returns the time it took
+def time_searches(search, grid, pairs, repeats):
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        for start_pos, end_pos in pairs:
+            search(grid, start_pos, end_pos)
+    return time.perf_counter() - start_time
+
+
+# Makes sure both searches agree on whether a path exists and its length
+def check_paths(grid, pairs):
+    for start_pos, end_pos in pairs:
+        old_path = pathfinding.breadth_first_search(grid, start_pos, end_pos)
+        new_path = pathfinding.a_star_search(grid, start_pos, end_pos)
+        if (old_path is None) != (new_path is None) or \
+                (old_path and len(old_path) != len(new_path)):
+            return False
+    return True
+
+
+# Compares both searches on every map and prints a table of the results
+def compare_searches(repeats=5):
+    print("%-24s %8s %12s %12s %8s %6s" % ("map", "searches", "bfs ms",
+                                           "a* ms", "speedup", "same"))
+    for file_name in sorted(glob.glob("levels/*_map_data.csv")):
+        grid = grid_world.Grid(file_name, seed=0)
+        if grid.player is None:
+            continue
+        pairs = search_pairs(grid)
+        bfs_time = time_searches(pathfinding.breadth_first_search, grid,
+                                 pairs, repeats)
+        a_star_time = time_searches(pathfinding.a_star_search, grid,
+                                    pairs, repeats)
+        print("%-24s %8d %12.2f %12.2f %7.1fx %6s" % (
+            get_map_name(file_name), len(pairs) * repeats,
+            bfs_time * 1000, a_star_time * 1000,
+            bfs_time / max(a_star_time, 1e-9),
+            "yes" if check_paths(grid, pairs) else "NO"))
+
+
+# Writes a random map with walls, spikes, switches, coins and enemies to a
+# CSV file in the same format as the level files
+def generate_map(file_name, size, enemy_count, seed=0):
+    generator = random.Random(seed)
+    rows = []
+    for row in range(size):
+        values = []
+        for column in range(size):
+            if row in (0, size - 1) or column in (0, size - 1):
+                values.append("wall")
+                continue
+            chance = generator.random()
+            if chance < 0.12:
+                values.append("wall")
+            elif chance < 0.14:
+                values.append("spikes" + generator.choice("ABCD") +
+                              generator.choice(["", " unarmed"]))
+            elif chance < 0.145:
+                values.append("switch" + generator.choice("ABCD"))
+            elif chance < 0.15:
+                values.append("coin")
+            else:
+                values.append("")
+        rows.append(values)
+    # Put the player in the middle and enemies on random empty tiles
+    rows[size // 2][size // 2] = "player"
+    placed = 0
+    while placed < enemy_count:
+        row, column = generator.randrange(1, size - 1), \
+                      generator.randrange(1, size - 1)
+        if rows[row][column] == "":
+            rows[row][column] = "enemy"
+            placed += 1
+    with open(file_name, "w") as file:
+        for values in rows:
+            file.write(",".join(values) + "\n")
+
+
+# Returns the name of a map from its data file name
+def get_map_name(file_name):
+    return os.path.basename(file_name).removesuffix("_map_data.csv")
+
+
+# Calls the function once per tick and returns the tick statistics
+def measure(function, ticks):
+    tick_times = []
+    for tick in range(ticks):
+        start_time = time.perf_counter()
+        function(tick)
+        tick_times.append(time.perf_counter() - start_time)
+    # Run again with memory tracing for the allocation statistics
+    tracemalloc.start()
+    for tick in range(ticks, ticks + min(ticks, 50)):
+        function(tick)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    tick_times.sort()
+    total_time = sum(tick_times)
+    return {"ticks": ticks,
+            "ticks_per_second": ticks / max(total_time, 1e-9),
+            "p50_ms": tick_times[len(tick_times) // 2] * 1000,
+            "p99_ms": tick_times[min(len(tick_times) - 1,
+                                     len(tick_times) * 99 // 100)] * 1000,
+            "peak_alloc_kb": peak_memory / 1024}
+
+
+# Makes the player walk around so that enemies keep chasing it
+def steer_player(grid, tick):
+    if tick % 100 == 0:
+        order = [directions.UP, directions.RIGHT, directions.DOWN,
+                 directions.LEFT]
+        grid.player.set_moving(None)
+        grid.player.set_moving(order[(tick // 100) % 4])
+
+
+# Benchmarks every hot path on one map and returns the results
+def benchmark_map(file_name, ticks):
+    results = {}
+
+    # One A* search per tick from the next enemy (or tile) to the player
+    grid = grid_world.Grid(file_name, seed=0)
+    player_pos = round(grid.player.row), round(grid.player.column)
+    starts = [(round(enemy.row), round(enemy.column))
+              for enemy in grid.enemies] or open_positions(grid)
+    results["a_star_search"] = measure(
+        lambda tick: pathfinding.a_star_search(
+            grid, starts[tick % len(starts)], player_pos), ticks)
+
+    # The same searches going from cluster to cluster, only the first
+    # cluster of each path is turned into steps
+    cluster_graph = ClusterGraph(grid)
+    results["cluster_search"] = measure(
+        lambda tick: cluster_graph.find_path(
+            starts[tick % len(starts)], player_pos), ticks)
+
+    # Entity updates with enemies searching on the game thread, sharing the
+    # paths they find through the grid's path cache
+    grid = grid_world.Grid(file_name, use_flow_field=False, seed=0)
+
+    def cached_update(tick):
+        steer_player(grid, tick)
+        grid.update_entities(0.01)
+    results["cached_update"] = measure(cached_update, ticks)
+    results["cached_update"]["path_cache"] = grid.path_cache.get_metrics()
+
+    # The shared distance field from the player
+    results["distance_field"] = measure(
+        lambda tick: pathfinding.distance_field(grid, player_pos), ticks)
+
+    # Entity updates with the player moving around
+    grid = grid_world.Grid(file_name, seed=0)
+
+    def update(tick):
+        steer_player(grid, tick)
+        grid.update_entities(0.01)
+    results["update_entities"] = measure(update, ticks)
+
+    # Drawing through a camera the size of the game's view, the way the
+    # game draws a frame: the whole view when the camera moved, otherwise
+    # only the changed tiles and what the entities covered. The player walks
+    # around and a switch is toggled every 10 ticks to redraw some tiles
+    grid = grid_world.Grid(file_name, seed=0)
+    camera = Camera(min(grid.width, VIEW_TILES[0]) * grid.tile_size,
+                    min(grid.height, VIEW_TILES[1]) * grid.tile_size)
+    surface = pygame.Surface(camera.rect.size)
+    switches = [tile for tile in grid.active_tiles
+                if tile.kind == grid_world.TILE_SWITCH]
+    entity_rects = []
+
+    def draw_grid(tick):
+        steer_player(grid, tick)
+        grid.player.update(0.01)
+        if switches and tick % 10 == 0:
+            switches[(tick // 10) % len(switches)].toggle()
+        if camera.follow(grid) or tick == 0:
+            grid.draw_grid(surface, camera.rect)
+        else:
+            grid.draw_grid_areas(surface, entity_rects, camera.rect)
+    results["draw_grid"] = measure(draw_grid, ticks)
+
+    def draw_entities(tick):
+        entity_rects[:] = grid.draw_entities(surface, camera.rect)
+    results["draw_entities"] = measure(draw_entities, ticks)
+    return results
+
+
+# Runs the benchmarks on all maps and writes the results to a JSON file
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Benchmarks the game.")
+    parser.add_argument("--ticks", type=int, default=100)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--large-size", type=int, default=256)
+    parser.add_argument("--large-enemies", type=int, default=300)
+    parser.add_argument("--compare-search", action="store_true",
+                        help="only compare the BFS and A* searches")
+    options = parser.parse_args(arguments)
+    if options.compare_search:
+        compare_searches()
+        return
+
+    # Drawing needs a display to convert sprites
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    SpriteRegistry.warm_up()
+
+    with tempfile.TemporaryDirectory() as folder:
+        file_names = sorted(glob.glob("levels/*_map_data.csv"))
+        large_map = os.path.join(folder, "large_%d_map_data.csv" %
+                                 options.large_size)
+        generate_map(large_map, options.large_size, options.large_enemies)
+        file_names.append(large_map)
+
+        results = {"time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                   "python": sys.version.split()[0],
+                   "pygame": pygame.version.ver,
+                   "maps": {}}
+        print("%-20s %-16s %10s %9s %9s %10s" % (
+            "map", "hot path", "ticks/s", "p50 ms", "p99 ms", "alloc kb"))
+        for file_name in file_names:
+            map_results = benchmark_map(file_name, options.ticks)
+            results["maps"][get_map_name(file_name)] = map_results
+            for hot_path, stats in map_results.items():
+                print("%-20s %-16s %10.0f %9.3f %9.3f %10.1f" % (
+                    get_map_name(file_name), hot_path,
+                    stats["ticks_per_second"], stats["p50_ms"],
+                    stats["p99_ms"], stats["peak_alloc_kb"]))
+                if "path_cache" in stats:
+                    print("%-20s %-16s %9.1f%% hit rate" % (
+                        "", "  path cache",
+                        stats["path_cache"]["hit_rate"] * 100))
+
+    with open(options.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print("Results written to " + options.output)
+
+
+# Starts the benchmark on run
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,2 +1,3 @@
+python level_format.py
 pyinstaller build.spec -w -y
 pause
\ No newline at end of file
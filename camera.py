@@ -0,0 +1,33 @@
+"""
+Mykyta S.
+camera.py
+
+A module that contains the camera, which decides what part of a map is on
+the screen. Maps that fit on the screen are always shown whole, larger ones
+scroll to keep the player in the middle of the view.
+"""
+
+import pygame
+
+
+# The rect of the map in pixels that is shown on the screen
+class Camera:
+
+    def __init__(self, width, height):
+        self.rect = pygame.Rect(0, 0, width, height)
+
+    # Centres the view on the player without showing anything outside of the
+    # map, returns True if the view has moved
+    def follow(self, grid):
+        player = grid.player
+        map_width = grid.width * grid.tile_size
+        map_height = grid.height * grid.tile_size
+        x = round((player.column + 0.5) * grid.tile_size -
+                  self.rect.width / 2)
+        y = round((player.row + 0.5) * grid.tile_size - self.rect.height / 2)
+        x = max(0, min(x, map_width - self.rect.width))
+        y = max(0, min(y, map_height - self.rect.height))
+        if (x, y) == self.rect.topleft:
+            return False
+        self.rect.topleft = x, y
+        return True
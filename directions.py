@@ -0,0 +1,36 @@
+"""
+Mykyta S.
+directions.py
+
+A module that contains the codes of the four directions entities move in and
+tables to look up what they mean, so that moving doesn't have to compare
+strings. Input scripts and corner tile names still use the names and letters,
+which are converted into codes once when they are read.
+"""
+
+UP = 0
+DOWN = 1
+LEFT = 2
+RIGHT = 3
+
+# (row, column) displacement of each direction
+DISPLACEMENTS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+# The opposite of each direction
+REVERSED = (DOWN, UP, RIGHT, LEFT)
+# Whether each direction moves along a column
+IS_VERTICAL = (True, True, False, False)
+
+NAMES = ("up", "down", "left", "right")
+# Letters used in the names of corner tiles
+LETTERS = "UDLR"
+CODES_BY_NAME = {name: code for code, name in enumerate(NAMES)}
+
+
+# Returns the code of a direction name such as "up"
+def from_name(name):
+    return CODES_BY_NAME[name]
+
+
+# Returns the code of a corner letter such as "U"
+def from_letter(letter):
+    return LETTERS.index(letter)
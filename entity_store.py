@@ -0,0 +1,81 @@
+"""
+Mykyta S.
+entity_store.py
+
+A module that keeps the state of many simple entities in flat arrays instead
+of separate objects: one array of rows, one of columns and one of the times
+the entities appeared on the map. Entities that use a store are thin views
+over one slot of it, and everything that happens to all of them every tick
+is done once for the whole store instead of once per entity.
+
+Removed entities are replaced by the last one, so the arrays never have gaps
+and only hold entities that are still on the map. A removed entity keeps the
+last position it had in the store.
+"""
+
+from array import array
+
+
+# Parallel arrays of positions and spawn times with the entities they belong
+# to. Each entity knows its slot, which is None when it isn't in the store
+class EntityStore:
+
+    def __init__(self):
+        self.entities = []
+        self.reset()
+
+    # Empties the arrays and resets the time
+    def reset(self):
+        self.rows = array("d")
+        self.columns = array("d")
+        self.spawn_times = array("d")
+        # Time passed since the store was created or cleared
+        self.time = 0
+
+    # Adds an entity at a position, starting its animation from now
+    def add(self, entity, row, column):
+        entity.slot = len(self.entities)
+        self.entities.append(entity)
+        self.rows.append(row)
+        self.columns.append(column)
+        self.spawn_times.append(self.time)
+
+    # Removes an entity by moving the last entity into its slot
+    def remove(self, entity):
+        slot = entity.slot
+        entity.last_position = self.rows[slot], self.columns[slot]
+        last = len(self.entities) - 1
+        if slot != last:
+            moved = self.entities[last]
+            self.entities[slot] = moved
+            self.rows[slot] = self.rows[last]
+            self.columns[slot] = self.columns[last]
+            self.spawn_times[slot] = self.spawn_times[last]
+            moved.slot = slot
+        self.entities.pop()
+        self.rows.pop()
+        self.columns.pop()
+        self.spawn_times.pop()
+        entity.slot = None
+
+    # Removes every entity and resets the time
+    def clear(self):
+        for slot, entity in enumerate(self.entities):
+            entity.last_position = self.rows[slot], self.columns[slot]
+            entity.slot = None
+        self.entities = []
+        self.reset()
+
+    # Advances the time of every entity in the store at once
+    def advance(self, delta_time):
+        self.time += delta_time
+
+    # Returns how long the entity in a slot has been on the map
+    def get_age(self, slot):
+        return self.time - self.spawn_times[slot]
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __iter__(self):
+        return iter(self.entities)
@@ -4,94 +4,601 @@ grid_world.py
 
 A module that contains the definition of a game map called the Grid, which
 stores the information about tiles and entities from a map data file.
+Map data files are loaded and cached by level_format.py.
+
+The map is drawn in square chunks of CHUNK_SIZE tiles. The surface of a
+chunk is only made the first time it is seen, so a large map costs nothing
+to draw until the camera gets to it, and only the surfaces of the chunks
+seen most recently are kept.
+
+Huge maps are also loaded a chunk at a time: the chunks around the player are
+parsed when the map is opened and the rest as the player gets closer to
+them. Cells of chunks that aren't loaded yet are walls to everything,
+including path finding.
 """
 
-# My own module
+import math
+import time
+import random
+from collections import deque, OrderedDict
+# My own modules
 from tiles import *
 from moving_entities import *
+from spatial_hash import SpatialHash
+from entity_store import EntityStore
+import level_format
+from sprite_registry import SpriteRegistry
+from profiler import Profiler
+import pathfinding
+from hierarchical_pathfinding import ClusterGraph
+from path_cache import PathCache
+
+# Number of tiles along each side of a chunk
+CHUNK_SIZE = 16
+# Lookup table from tile kinds to whether enemies can walk on them, spikes
+# are passable only while unarmed and are set on their own
+PASSABLE_KINDS = bytes(0 if kind == TILE_WALL else 1 for kind in range(256))
 
 
 # A class that stores information about the game map, tiles on the grid,
 # and all entities located within its boundaries.
 class Grid:
+    # Returned for positions outside the map
+    outside_tile = Tile("wall")
+    # Tiles that never change are shared by all cells of the same kind
+    wall_tile = outside_tile
+    empty_tile = Tile("empty")
+    corner_tiles = {}
 
     # Initialize all the needed variables
-    def __init__(self, file_name, tile_size=16):
-        self.map = {}
+    def __init__(self, file_name, tile_size=16, use_flow_field=True,
+                 path_service=None, seed=None):
+        # Corners and active tiles by cell index, every other cell is a shared
+        # wall or empty tile found from its kind
+        self.tiles = {}
         self.width, self.height = 0, 0
         self.tile_size = tile_size
-        self.floor_sprite = pygame.image.load("sprites/floor.png")
+        self.floor_sprite = SpriteRegistry.get_sprite("floor")
         self.active_tiles = []
+        # Lists of spikes toggled by the switches of each letter
+        self.spikes_by_letter = {}
         self.enemies = []
         self.player = None
-        self.coins = []
-        self.surface = None
-
-        # Opens the map data file and reads into memory
-        with open(file_name) as file:
-            for row, line in enumerate(file):
-                if len(line.strip()) == 0:
-                    continue
-                self.height = max(self.height, row + 1)
-                for column, value in enumerate(line.strip().split(",")):
-                    value = value.strip()
-                    self.width = max(self.width, column + 1)
-                    # Add a tile based on the name
-                    if value == "wall":
-                        new_tile = Tile("wall")
-                    elif "spikes" in value:
-                        new_tile = Spikes(value)
-                    elif "switch" in value:
-                        new_tile = Switch(value)
-                    elif "corner" in value:
-                        new_tile = Corner(value)
-                    elif "exit" in value:
-                        new_tile = Exit(value)
-                    else:
-                        new_tile = Tile("empty")
-                    # Add player and enemies
-                    if value == "player":
-                        self.player = Player(self, row, column)
-                    elif value == "enemy":
-                        self.enemies.append(Enemy(self, row, column))
-                    elif value == "coin":
-                        self.coins.append(Coin(self, row, column))
-
-                    # Add the new tile to the dictionary based on row, column
-                    self.map[(row, column)] = new_tile
-                    if new_tile.is_active:
-                        new_tile.set_coordinates(self, row, column)
-                        self.active_tiles.append(new_tile)
+        self.coins = EntityStore()
+        # Surfaces of the chunks that were drawn, by (chunk row, column), the
+        # most recently used last. Tiles at the positions in dirty_tiles are
+        # redrawn on them. At least the chunks of the last drawn view are
+        # kept, so drawing the whole map keeps a surface for every chunk
+        self.chunks = OrderedDict()
+        self.max_chunk_surfaces = 64
+        self.view_chunk_count = 0
+        self.dirty_tiles = set()
+        # The level being streamed if the map is loaded a chunk at a time,
+        # the loaded chunks in the order they were loaded and at most
+        # chunk_budget chunks loaded (and unloaded) per tick. Once more than
+        # max_loaded_chunks are loaded, the ones far from the player are
+        # unloaded
+        self.streamed_level = None
+        self.loaded_chunks = []
+        self.is_chunk_loaded = bytearray()
+        self.chunk_budget = 8
+        self.max_loaded_chunks = 256
+        # What changed in unloaded chunks of a streamed level, so that they
+        # load again the way they were left: the spawns of enemies and coins
+        # from the file that are gone, the spawns of enemies on the map or
+        # waiting in an unloaded chunk, the (spawn, position) of those
+        # enemies and the coins dropped in each unloaded chunk, and the
+        # indexes of activated switches that were unloaded
+        self.removed_spawns = set()
+        self.spawns_in_play = set()
+        self.enemy_spawns = {}
+        self.coin_spawns = {}
+        self.unloaded_enemies = {}
+        self.unloaded_coins = {}
+        self.activated_switches = set()
+        # How many times the switches of each letter were toggled, so that
+        # spikes loaded later start in the right state
+        self.switch_toggles = {}
+        # Enemies make random decisions with this generator, so that the same
+        # seed and inputs always play out the same way
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.random = random.Random(seed)
+        # The number of updates since the level was loaded or restarted
+        self.tick = 0
+        # Spatial indexes of live enemies and coins for proximity checks
+        self.enemy_index = SpatialHash()
+        self.coin_index = SpatialHash()
+        # Enemies follow one shared distance field towards the player instead
+        # of searching for their own paths
+        self.use_flow_field = use_flow_field
+        self.flow_field = None
+        self.flow_field_origin = None
+        self.flow_field_version = -1
+        # Increases every time spikes are toggled
+        self.passability_version = 0
+        # Finds enemy paths in the background when not using the flow field
+        self.path_service = path_service
+        # Entrances between clusters of the map for long searches, used when
+        # enemies search for their own paths on the game thread. Chases
+        # shorter than hierarchical_distance steps search every tile
+        self.cluster_graph = None
+        self.hierarchical_distance = 32
+        # Paths found by enemies searching on the game thread, shared by all
+        # of them
+        self.path_cache = PathCache()
+        # Enemies waiting for a new path after spikes were toggled, at most
+        # path_budget of them are given one per tick
+        self.path_requests = deque()
+        self.path_budget = 4
+        # Enemies further than far_distance tiles from the player along
+        # either axis only update every far_update_interval ticks, ones
+        # further than sleep_distance wait for the player to come closer and
+        # ones further than chase_distance steps don't follow the flow field
+        self.far_distance = 48
+        self.far_update_interval = 4
+        self.sleep_distance = 96
+        self.chase_distance = 64
+
+        # Gets the map data from the cache or the file
+        self.build_map(level_format.open_level(file_name))
+        if not use_flow_field and path_service is None:
+            self.cluster_graph = ClusterGraph(self)
+        # The state right after loading, for restarting the level
+        self.snapshot = self.take_snapshot()
+
+    # Creates tiles and entities from the level data
+    def build_map(self, level):
+        self.width, self.height = level.width, level.height
+        self.chunk_columns = math.ceil(self.width / CHUNK_SIZE)
+        if isinstance(level, level_format.StreamedLevel):
+            # Everything is a wall until its chunk is loaded
+            self.streamed_level = level
+            self.tile_kinds = bytearray([TILE_WALL]) * \
+                (self.width * self.height)
+            self.passable = bytearray(self.width * self.height)
+            self.is_chunk_loaded = bytearray(
+                math.ceil(self.height / CHUNK_SIZE) * self.chunk_columns)
+            row, column = level.player or (0, 0)
+            if level.player is not None:
+                self.player = Player(self, row, column)
+            # Load what is in view right away
+            self.load_chunks_near(row, column, CHUNK_SIZE)
+            return
+        # Tile kinds and passability for enemies, indexed by
+        # row * width + column so that movement and searches never look at
+        # tile names
+        self.tile_kinds = bytearray(level.kinds)
+        self.passable = bytearray(self.tile_kinds.translate(PASSABLE_KINDS))
+        self.add_level_data(level)
+        if level.player is not None:
+            self.player = Player(self, *level.player)
+
+    # Creates the tiles, enemies and coins in the tables of the level data
+    def add_level_data(self, level):
+        # Static tiles are shared, only active tiles get their own objects
+        for index, name in level.corners:
+            if name not in Grid.corner_tiles:
+                Grid.corner_tiles[name] = Corner(name)
+            self.tiles[index] = Grid.corner_tiles[name]
+        active_tiles = []
+        for index, name, is_armed in level.spikes:
+            spikes = Spikes(name)
+            spikes.is_armed = is_armed
+            active_tiles.append((index, spikes))
+        for index, name in level.switches:
+            active_tiles.append((index, Switch(name)))
+        for index, name in level.exits:
+            active_tiles.append((index, Exit(name)))
+        active_tiles.sort(key=lambda entry: entry[0])
+        for index, tile in active_tiles:
+            row, column = divmod(index, self.width)
+            self.tiles[index] = tile
+            tile.set_coordinates(self, row, column)
+            self.active_tiles.append(tile)
+            if tile.kind == TILE_SPIKES:
+                letters = set(tile.name.removeprefix("spikes"))
+                # Spikes whose switches were used before they were loaded
+                if sum(self.switch_toggles.get(letter, 0)
+                       for letter in letters) % 2 == 1:
+                    tile.is_armed = not tile.is_armed
+                for letter in letters:
+                    self.spikes_by_letter.setdefault(letter, []).append(tile)
+                self.passable[index] = not tile.is_armed
+
+        # Add enemies and coins
+        for row, column in level.enemies:
+            enemy = Enemy(self, row, column)
+            self.enemies.append(enemy)
+            self.enemy_index.insert(enemy)
+        for row, column in level.coins:
+            self.add_coin(row, column)
+
+    # Parses a chunk of a streamed level and adds its tiles and entities,
+    # leaving out the ones that are gone or elsewhere since it was unloaded
+    def load_chunk(self, chunk_row, chunk_column):
+        key = chunk_row, chunk_column
+        first_row = chunk_row * CHUNK_SIZE
+        first_column = chunk_column * CHUNK_SIZE
+        level = self.streamed_level.read_area(first_row, first_column,
+                                              CHUNK_SIZE, CHUNK_SIZE)
+        level.enemies = [spawn for spawn in level.enemies
+                         if spawn not in self.removed_spawns and
+                         spawn not in self.spawns_in_play]
+        level.coins = [spawn for spawn in level.coins
+                       if spawn not in self.removed_spawns]
+        self.coin_spawns[key] = set(level.coins)
+        for row in range(level.height):
+            start = (first_row + row) * self.width + first_column
+            kinds = level.kinds[row * level.width:(row + 1) * level.width]
+            self.tile_kinds[start:start + level.width] = kinds
+            self.passable[start:start + level.width] = \
+                kinds.translate(PASSABLE_KINDS)
+        self.is_chunk_loaded[chunk_row * self.chunk_columns +
+                             chunk_column] = 1
+        self.loaded_chunks.append(key)
+        # Walls were drawn in place of the chunk until now
+        self.chunks.pop(key, None)
+        enemy_count = len(self.enemies)
+        tile_count = len(self.active_tiles)
+        self.add_level_data(level)
+        for enemy, spawn in zip(self.enemies[enemy_count:], level.enemies):
+            self.enemy_spawns[enemy] = spawn
+            self.spawns_in_play.add(spawn)
+        for spawn, position in self.unloaded_enemies.pop(key, ()):
+            enemy = Enemy(self, *position)
+            self.enemies.append(enemy)
+            self.enemy_index.insert(enemy)
+            self.enemy_spawns[enemy] = spawn
+        for position in self.unloaded_coins.pop(key, ()):
+            self.add_coin(*position)
+        for tile in self.active_tiles[tile_count:]:
+            index = tile.row * self.width + tile.column
+            if tile.kind == TILE_SWITCH and index in self.activated_switches:
+                self.activated_switches.discard(index)
+                tile.is_activated = True
+        if self.cluster_graph is not None:
+            self.cluster_graph.mark_dirty(first_row, first_column,
+                                          level.height, level.width)
+
+    # Loads the chunks of a streamed level closer than radius tiles to a
+    # position along both axes, nearest first and at most budget of them
+    # (all of them by default). Paths and the flow field are only found
+    # again once all of them are loaded, until then the chunks that are
+    # still missing are walls to them anyway
+    def load_chunks_near(self, row, column, radius, budget=None):
+        center_row = int(row) // CHUNK_SIZE
+        center_column = int(column) // CHUNK_SIZE
+        chunks = []
+        for chunk_row in range(
+                max(int(row - radius) // CHUNK_SIZE, 0),
+                min(int(row + radius) // CHUNK_SIZE,
+                    (self.height - 1) // CHUNK_SIZE) + 1):
+            for chunk_column in range(
+                    max(int(column - radius) // CHUNK_SIZE, 0),
+                    min(int(column + radius) // CHUNK_SIZE,
+                        self.chunk_columns - 1) + 1):
+                if not self.is_chunk_loaded[chunk_row * self.chunk_columns +
+                                            chunk_column]:
+                    chunks.append((chunk_row, chunk_column))
+        chunks.sort(key=lambda chunk: max(abs(chunk[0] - center_row),
+                                          abs(chunk[1] - center_column)))
+        for chunk_row, chunk_column in chunks[:budget]:
+            self.load_chunk(chunk_row, chunk_column)
+        if len(chunks) > 0 and (budget is None or len(chunks) <= budget):
+            self.passability_version += 1
+
+    # Unloads the loaded chunks farthest from a position, at most budget of
+    # them (all of them by default), until at most max_loaded_chunks are
+    # loaded. Chunks closer than keep_distance tiles along both axes, which
+    # load_chunks_near would load again, are kept
+    def unload_far_chunks(self, row, column, keep_distance, budget=None):
+        excess = len(self.loaded_chunks) - self.max_loaded_chunks
+        if excess <= 0:
+            return
+        center_row = int(row) // CHUNK_SIZE
+        center_column = int(column) // CHUNK_SIZE
+        keep_chunks = keep_distance // CHUNK_SIZE + 1
+        far_chunks = []
+        for chunk in self.loaded_chunks:
+            distance = max(abs(chunk[0] - center_row),
+                           abs(chunk[1] - center_column))
+            if distance > keep_chunks:
+                far_chunks.append((distance, chunk))
+        far_chunks.sort(reverse=True)
+        for _, chunk in far_chunks[:min(excess, budget or excess)]:
+            self.unload_chunk(*chunk)
+        if len(far_chunks) > 0:
+            self.passability_version += 1
+
+    # Turns a loaded chunk back into walls and removes its tiles and the
+    # entities in it. Unless the changes are forgotten, the enemies that are
+    # gone, the coins that were picked up or dropped and the activated
+    # switches are remembered for when it is loaded again
+    def unload_chunk(self, chunk_row, chunk_column, forget_changes=False):
+        key = chunk_row, chunk_column
+        self.is_chunk_loaded[chunk_row * self.chunk_columns + chunk_column] = 0
+        self.loaded_chunks.remove(key)
+        self.chunks.pop(key, None)
+        first_row = chunk_row * CHUNK_SIZE
+        first_column = chunk_column * CHUNK_SIZE
+        columns = min(CHUNK_SIZE, self.width - first_column)
+        for row in range(first_row, min(first_row + CHUNK_SIZE, self.height)):
+            start = row * self.width + first_column
+            self.tile_kinds[start:start + columns] = \
+                bytes([TILE_WALL]) * columns
+            self.passable[start:start + columns] = bytes(columns)
+            for index in range(start, start + columns):
+                self.tiles.pop(index, None)
+        if self.cluster_graph is not None:
+            self.cluster_graph.mark_dirty(first_row, first_column,
+                                          CHUNK_SIZE, columns)
+
+        # Checks if a position is in the chunk
+        def is_in_chunk(row, column):
+            return round(row) // CHUNK_SIZE == chunk_row and \
+                round(column) // CHUNK_SIZE == chunk_column
+
+        removed_tiles = {tile for tile in self.active_tiles
+                         if is_in_chunk(tile.row, tile.column)}
+        self.active_tiles = [tile for tile in self.active_tiles
+                             if tile not in removed_tiles]
+        for letter, spikes_list in self.spikes_by_letter.items():
+            self.spikes_by_letter[letter] = [
+                spikes for spikes in spikes_list
+                if spikes not in removed_tiles]
+        removed_enemies = [enemy for enemy in self.enemies
+                           if is_in_chunk(enemy.row, enemy.column)]
+        self.enemies = [enemy for enemy in self.enemies
+                        if not is_in_chunk(enemy.row, enemy.column)]
+        for enemy in removed_enemies:
+            spawn = self.enemy_spawns.pop(enemy)
+            if not enemy.is_dead:
+                self.enemy_index.remove(enemy)
+            if forget_changes:
+                self.spawns_in_play.discard(spawn)
+            elif enemy.is_dead:
+                self.spawns_in_play.discard(spawn)
+                self.removed_spawns.add(spawn)
+            else:
+                self.unloaded_enemies.setdefault(key, []).append(
+                    (spawn, (enemy.row, enemy.column)))
+        if removed_enemies:
+            self.path_requests = deque(enemy for enemy in self.path_requests
+                                       if enemy not in removed_enemies)
+            if self.path_service is not None:
+                self.path_service.forget(removed_enemies)
+        coin_spawns = self.coin_spawns.pop(key, set())
+        for coin in [coin for coin in self.coins
+                     if is_in_chunk(coin.row, coin.column)]:
+            position = round(coin.row), round(coin.column)
+            self.coin_index.remove(coin)
+            self.coins.remove(coin)
+            if position in coin_spawns:
+                coin_spawns.discard(position)
+            elif not forget_changes:
+                self.unloaded_coins.setdefault(key, []).append(position)
+        if forget_changes:
+            return
+        # Coins from the file that aren't on the map were picked up
+        self.removed_spawns.update(coin_spawns)
+        for tile in removed_tiles:
+            if tile.kind == TILE_SWITCH and tile.is_activated:
+                self.activated_switches.add(tile.row * self.width +
+                                            tile.column)
+
+    # Returns all the state that changes while playing: entity positions,
+    # the coins on the map, the states of the active tiles, the state of
+    # the random generator, how many times switches were toggled and the
+    # passability version
+    def take_snapshot(self):
+        return ((self.player.row, self.player.column),
+                tuple((enemy.row, enemy.column) for enemy in self.enemies),
+                tuple((coin, coin.row, coin.column) for coin in self.coins),
+                tuple(tile.get_state() for tile in self.active_tiles),
+                self.random.getstate(), dict(self.switch_toggles),
+                self.passability_version)
+
+    # Puts the map back into the state of a snapshot (by default the one
+    # taken after loading) without loading anything. Streamed levels can
+    # only go back to the state after loading, they unload every chunk and
+    # load the ones around the player from the file again
+    def restore_snapshot(self, snapshot=None):
+        if snapshot is None:
+            snapshot = self.snapshot
+        player_position, enemy_positions, coins, tile_states, \
+            random_state, switch_toggles, passability_version = snapshot
+        self.switch_toggles = dict(switch_toggles)
+        self.random.setstate(random_state)
+        self.tick = 0
+        self.player.reset_state(*player_position)
+        if self.streamed_level is not None:
+            self.reload_streamed_level(*player_position)
+        else:
+            self.restore_entities(enemy_positions, coins, tile_states)
+        # Paths found during the last attempt are forgotten, so that it plays
+        # out the same way as after loading
+        self.passability_version = passability_version
+        self.flow_field = None
+        self.path_cache.clear()
+        self.path_requests.clear()
+        if self.path_service is not None:
+            self.path_service.forget(self.enemies)
+            self.path_service.forget_snapshot()
+
+    # Forgets every change to a streamed level and loads the chunks around a
+    # position from the file again
+    def reload_streamed_level(self, row, column):
+        for chunk in list(self.loaded_chunks):
+            self.unload_chunk(*chunk, forget_changes=True)
+        for records in (self.removed_spawns, self.spawns_in_play,
+                        self.enemy_spawns, self.coin_spawns,
+                        self.unloaded_enemies, self.unloaded_coins,
+                        self.activated_switches):
+            records.clear()
+        self.load_chunks_near(row, column, CHUNK_SIZE)
+
+    # Puts the entities and active tiles back the way they were in a
+    # snapshot, removing coins dropped since
+    def restore_entities(self, enemy_positions, coins, tile_states):
+        self.enemy_index = SpatialHash()
+        for enemy, position in zip(self.enemies, enemy_positions):
+            enemy.reset_state(*position)
+            self.enemy_index.insert(enemy)
+        # Coins dropped by enemies since the snapshot are removed
+        self.coins.clear()
+        self.coin_index = SpatialHash()
+        for coin, row, column in coins:
+            coin.reset_state(row, column)
+            self.coin_index.insert(coin)
+        for tile, state in zip(self.active_tiles, tile_states):
+            tile.set_state(state)
 
     # Update entity movement
     def update_entities(self, delta_time):
+        # Measure every type of entity if the profiler is on
+        profiling = Profiler.enabled
+        if profiling:
+            start = time.perf_counter()
+        self.tick += 1
+        # Load the chunks of a streamed level that the player is getting to
+        if self.streamed_level is not None:
+            self.load_chunks_near(self.player.row, self.player.column,
+                                  self.sleep_distance, self.chunk_budget)
+            self.unload_far_chunks(self.player.row, self.player.column,
+                                   self.sleep_distance, self.chunk_budget)
+            if profiling:
+                start = Profiler.lap("loading", start)
+        self.process_path_requests()
+        if profiling:
+            start = Profiler.lap("paths", start)
         # Update the player and the boomerang if it's in the air
         self.player.update(delta_time)
+        if profiling:
+            start = Profiler.lap("player", start)
         if self.player.boomerang_in_air():
             self.player.boomerang.update(delta_time)
-        # Update enemies
-        for enemy in self.enemies:
-            enemy.update(delta_time)
-        # Update coins and remove ones that were picked up
-        i = 0
-        while i < len(self.coins):
-            self.coins[i].update(delta_time)
-            if self.coins[i].is_picked_up:
-                self.coins.remove(self.coins[i])
-            else:
-                i += 1
+            if profiling:
+                start = Profiler.lap("boomerang", start)
+        # Update enemies, the far away ones less often with longer steps
+        player_row, player_column = self.player.row, self.player.column
+        for i, enemy in enumerate(self.enemies):
+            distance = max(abs(enemy.row - player_row),
+                           abs(enemy.column - player_column))
+            if distance <= self.far_distance:
+                enemy.update(delta_time)
+            elif distance <= self.sleep_distance and \
+                    (self.tick + i) % self.far_update_interval == 0:
+                enemy.update(delta_time * self.far_update_interval)
+        if profiling:
+            start = Profiler.lap("enemies", start)
+        self.check_collisions()
+        if profiling:
+            start = Profiler.lap("collisions", start)
+        # Animate all coins at once, picked up ones are already removed
+        self.coins.advance(delta_time)
+        if profiling:
+            Profiler.lap("coins", start)
+
+    # Returns a summary of how the level is going
+    def get_summary(self):
+        return {"ticks": self.tick,
+                "is_dead": self.player.is_dead,
+                "on_exit": bool(self.player.on_exit),
+                "coins": self.player.coin_count,
+                "throws": self.player.throw_count,
+                "enemies_alive": sum(not enemy.is_dead
+                                     for enemy in self.enemies),
+                "position": (round(self.player.row, 4),
+                             round(self.player.column, 4))}
+
+    # Checks for the boomerang hitting enemies, enemies touching the player and
+    # the player picking up coins using the spatial indexes
+    def check_collisions(self):
+        player = self.player
+        # Enemies die if hit by the boomerang
+        if player.boomerang_in_air():
+            boomerang = player.boomerang
+            for enemy in self.enemy_index.query(boomerang.row,
+                                                boomerang.column, 0.7):
+                enemy.kill()
+                boomerang.bounce()
+        # Enemies kill the player on touch
+        if self.enemy_index.is_occupied(player.row, player.column, 0.7):
+            player.kill()
+        # Add to score if a coin touches the player
+        for coin in self.coin_index.query(player.row, player.column, 0.7):
+            coin.pick_up()
 
-    # Draw all entities
-    def draw_entities(self, surface):
-        # Draw enemies and coins
+    # Adds a new coin to the map
+    def add_coin(self, row, column):
+        coin = Coin(self, row, column)
+        self.coin_index.insert(coin)
+
+    # Queues a new path for the enemies that are affected by toggled spikes.
+    # With the flow field nothing has to be done since it is rebuilt once
+    # for everyone when the spikes change
+    def invalidate_paths(self, toggled_spikes):
+        if self.use_flow_field or len(toggled_spikes) == 0:
+            return
+        changed = {(spikes.row, spikes.column) for spikes in toggled_spikes}
+        opened = [(spikes.row, spikes.column) for spikes in toggled_spikes
+                  if not spikes.is_armed]
+        player_pos = round(self.player.row), round(self.player.column)
         for enemy in self.enemies:
-            surface.blit(*enemy.draw_sprite())
-        for coin in self.coins:
-            surface.blit(*coin.draw_sprite())
-        # Draw the player and the boomerang if it's in the air
-        surface.blit(*self.player.draw_sprite())
+            if not enemy.is_dead and \
+                    enemy.is_path_affected(changed, opened, player_pos):
+                self.request_path(enemy)
+
+    # Adds an enemy to the queue of path requests
+    def request_path(self, enemy):
+        if enemy not in self.path_requests:
+            self.path_requests.append(enemy)
+
+    # Finds new paths for up to path_budget queued enemies
+    def process_path_requests(self):
+        for _ in range(min(self.path_budget, len(self.path_requests))):
+            enemy = self.path_requests.popleft()
+            if not enemy.is_dead:
+                enemy.update_path(True)
+
+    # Returns the distance field towards the player, rebuilding it only when
+    # the player moves to another tile or the spikes change
+    def get_flow_field(self):
+        player_pos = round(self.player.row), round(self.player.column)
+        if self.flow_field is None or \
+                self.flow_field_origin != player_pos or \
+                self.flow_field_version != self.passability_version:
+            self.flow_field = pathfinding.distance_field(
+                self, player_pos, self.chase_distance)
+            self.flow_field_origin = player_pos
+            self.flow_field_version = self.passability_version
+        return self.flow_field
+
+    # Draws all entities and returns the rects that were drawn on. With a
+    # camera, the rect of the map in pixels that the surface shows, only the
+    # entities in view are drawn and they are drawn relative to it
+    def draw_entities(self, surface, camera=None):
+        entities = [*self.enemies, *self.coins, self.player]
         if self.player.boomerang_in_air():
-            surface.blit(*self.player.boomerang.draw_sprite())
+            entities.append(self.player.boomerang)
+        if camera is None:
+            return [surface.blit(*entity.draw_sprite())
+                    for entity in entities]
+        # Only draw entities in view, sprites can stick out of their tile so
+        # allow a tile of margin
+        top = camera.top / self.tile_size - 2
+        bottom = camera.bottom / self.tile_size + 1
+        left = camera.left / self.tile_size - 2
+        right = camera.right / self.tile_size + 1
+        rects = []
+        for entity in entities:
+            if top <= entity.row <= bottom and left <= entity.column <= right:
+                sprite, rect = entity.draw_sprite()
+                rects.append(surface.blit(sprite, (rect[0] - camera.x,
+                                                   rect[1] - camera.y)))
+        return rects
 
     # Returns the rect of a tile based on the grid
     def get_tile_rect(self, row, column):
@@ -99,30 +606,155 @@ class Grid:
         y = self.tile_size * row
         return pygame.Rect(x, y, self.tile_size, self.tile_size)
 
-    # Draws the entire grid and returns the picture
-    def draw_grid(self, screen : pygame.Surface):
-        # Create a new surface / clear the previous one
-        self.surface = pygame.Surface((self.width * self.tile_size,
-                                       self.height * self.tile_size)) \
-            .convert_alpha()
-        # Draw individual tiles
-        for row in range(self.height):
-            for column in range(self.width):
+    # Returns the rect of the whole map in pixels
+    def get_map_rect(self):
+        return pygame.Rect(0, 0, self.width * self.tile_size,
+                           self.height * self.tile_size)
+
+    # Returns the surface of a chunk, drawing it the first time it is needed.
+    # Chunks of a streamed level that aren't loaded yet are drawn as walls,
+    # drawing never loads them. Only max_chunk_surfaces surfaces are kept,
+    # the ones used least recently are drawn again later
+    def get_chunk(self, chunk_row, chunk_column):
+        key = chunk_row, chunk_column
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+        chunk = self.draw_chunk(chunk_row, chunk_column)
+        self.chunks[key] = chunk
+        while len(self.chunks) > max(self.max_chunk_surfaces,
+                                     self.view_chunk_count):
+            self.chunks.popitem(last=False)
+        return chunk
+
+    # Draws the floor and every tile of a chunk onto a new surface
+    def draw_chunk(self, chunk_row, chunk_column):
+        first_row = chunk_row * CHUNK_SIZE
+        first_column = chunk_column * CHUNK_SIZE
+        rows = min(CHUNK_SIZE, self.height - first_row)
+        columns = min(CHUNK_SIZE, self.width - first_column)
+        chunk = pygame.Surface((columns * self.tile_size,
+                                rows * self.tile_size)).convert_alpha()
+        for row in range(rows):
+            for column in range(columns):
+                rect = self.get_tile_rect(row, column)
                 # First render floor
-                self.surface.blit(self.floor_sprite,
-                                  self.get_tile_rect(row, column))
+                chunk.blit(self.floor_sprite, rect)
                 # Then draw a tile on top of it
-                self.map[(row, column)].draw(self.surface,
-                                             self.get_tile_rect(row, column))
-        # Blit the final image onto the screen
-        screen.blit(self.surface, screen.get_rect())
+                self.get_tile_at(first_row + row,
+                                 first_column + column).draw(chunk, rect)
+        return chunk
+
+    # Returns (chunk row, chunk column) of every chunk that overlaps a rect
+    # of the map in pixels
+    def get_chunks_in(self, area):
+        chunk_pixels = CHUNK_SIZE * self.tile_size
+        rows = range(max(area.top // chunk_pixels, 0),
+                     min((area.bottom - 1) // chunk_pixels,
+                         (self.height - 1) // CHUNK_SIZE) + 1)
+        columns = range(max(area.left // chunk_pixels, 0),
+                        min((area.right - 1) // chunk_pixels,
+                            (self.width - 1) // CHUNK_SIZE) + 1)
+        return [(row, column) for row in rows for column in columns]
+
+    # Draws a rect of the map in pixels from the chunks onto the screen,
+    # which shows the part of the map in the camera rect
+    def draw_map_area(self, screen: pygame.Surface, area, camera):
+        chunk_pixels = CHUNK_SIZE * self.tile_size
+        for chunk_row, chunk_column in self.get_chunks_in(area):
+            chunk = self.get_chunk(chunk_row, chunk_column)
+            x, y = chunk_column * chunk_pixels, chunk_row * chunk_pixels
+            part = area.clip(pygame.Rect((x, y), chunk.get_size()))
+            screen.blit(chunk, (part.x - camera.x, part.y - camera.y),
+                        part.move(-x, -y))
+
+    # Draws the part of the grid the camera sees (by default the whole map)
+    # onto the screen, only redrawing the tiles that have changed since the
+    # last frame and the chunks that haven't been seen yet
+    def draw_grid(self, screen: pygame.Surface, camera=None):
+        if camera is None:
+            camera = self.get_map_rect()
+        self.view_chunk_count = len(self.get_chunks_in(camera))
+        self.redraw_dirty_tiles()
+        self.draw_map_area(screen, camera, camera)
+
+    # Draws only the changed tiles and the given areas of the screen from the
+    # grid, used to cover what was drawn over the grid on the last frame
+    # when the camera hasn't moved. Returns the rects of the screen that were
+    # drawn on
+    def draw_grid_areas(self, screen: pygame.Surface, rects, camera=None):
+        if camera is None:
+            camera = self.get_map_rect()
+        self.view_chunk_count = len(self.get_chunks_in(camera))
+        changed_rects = [rect.move(-camera.x, -camera.y)
+                         for rect in self.redraw_dirty_tiles()] + rects
+        for rect in changed_rects:
+            self.draw_map_area(screen, rect.move(camera.x, camera.y), camera)
+        return changed_rects
+
+    # Redraws changed tiles on the chunks that were already drawn and returns
+    # the rects of the changed tiles on the map
+    def redraw_dirty_tiles(self):
+        rects = []
+        for row, column in self.dirty_tiles:
+            chunk = self.chunks.get((row // CHUNK_SIZE, column // CHUNK_SIZE))
+            # Chunks that weren't drawn yet will be drawn as they are now
+            if chunk is None:
+                continue
+            rect = self.get_tile_rect(row % CHUNK_SIZE, column % CHUNK_SIZE)
+            chunk.blit(self.floor_sprite, rect)
+            self.get_tile_at(row, column).draw(chunk, rect)
+            rects.append(self.get_tile_rect(row, column))
+        self.dirty_tiles.clear()
+        return rects
+
+    # Returns the active tiles of a kind closer than radius to the position,
+    # only looking at the cells around it instead of every active tile
+    def get_active_tiles_near(self, row, column, kind, radius):
+        tiles = []
+        for tile_row in range(math.ceil(row - radius),
+                              math.floor(row + radius) + 1):
+            for tile_column in range(math.ceil(column - radius),
+                                     math.floor(column + radius) + 1):
+                if self.get_kind_at(tile_row, tile_column) == kind and \
+                        (tile_row - row) ** 2 + (tile_column - column) ** 2 \
+                        < radius * radius:
+                    tiles.append(self.tiles[tile_row * self.width +
+                                            tile_column])
+        return tiles
 
     # Checks if the player can go there
     def is_open_space(self, row, column):
-        if (row, column) not in map:
-            return False
-        return self.map[(row, column)].name != "wall"
+        return self.get_kind_at(row, column) != TILE_WALL
 
     # Returns the tile at this location
     def get_tile_at(self, row, column):
-        return self.map.get((row, column), Tile())
+        kind = self.get_kind_at(row, column)
+        if kind == TILE_WALL:
+            return Grid.wall_tile
+        elif kind == TILE_EMPTY:
+            return Grid.empty_tile
+        return self.tiles[row * self.width + column]
+
+    # Returns the kind of the tile at this location, walls outside the map
+    def get_kind_at(self, row, column):
+        if 0 <= row < self.height and 0 <= column < self.width:
+            return self.tile_kinds[row * self.width + column]
+        return TILE_WALL
+
+    # Checks if an enemy can walk onto this location (no walls or armed spikes)
+    def is_passable(self, row, column):
+        if 0 <= row < self.height and 0 <= column < self.width:
+            return self.passable[row * self.width + column]
+        return 0
+
+    # Recalculates passability of a tile after it changes (spikes toggling)
+    def update_passability(self, row, column):
+        tile = self.get_tile_at(row, column)
+        self.passable[row * self.width + column] = \
+            tile.kind != TILE_WALL and \
+            not (tile.kind == TILE_SPIKES and tile.is_armed)
+        self.passability_version += 1
+        if self.cluster_graph is not None:
+            self.cluster_graph.mark_dirty(row, column)
@@ -0,0 +1,132 @@
+"""
+Mykyta S.
+headless.py
+
+A module that runs the game simulation without a window, sound or sprites.
+Inputs come from a script instead of the keyboard, which makes it possible to
+run thousands of ticks per second for testing and AI evaluation.
+
+Input script files have lines of a tick number, an action (press, release or
+throw) and a direction for press and release, separated by commas:
+
+    0,press,right
+    50,throw,
+    120,release,right
+
+Usage: python headless.py map_name [script_file] [max_ticks]
+"""
+
+import os
+import sys
+import time
+
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+import pygame
+
+# My own modules
+import grid_world
+import directions
+from sprite_registry import SpriteRegistry
+
+
+# Reads an input script file into a list of (tick, action, direction), with
+# the direction names turned into direction codes
+def load_input_script(file_name):
+    script = []
+    with open(file_name) as file:
+        for line in file:
+            if len(line.strip()) == 0:
+                continue
+            values = [value.strip() for value in line.strip().split(",")]
+            direction = directions.from_name(values[2]) \
+                if len(values) > 2 and values[2] else None
+            script.append((int(values[0]), values[1], direction))
+    return script
+
+
+# Steps a grid with scripted inputs at a fixed time step without any display
+class HeadlessGame:
+
+    # Loads the map without loading any sprites
+    def __init__(self, map_name, delta_time=0.01, use_flow_field=True,
+                 path_service=None, seed=None):
+        SpriteRegistry.headless = True
+        self.delta_time = delta_time
+        self.current_map = map_name
+        self.grid = grid_world.Grid("levels/" + map_name + "_map_data.csv",
+                                    use_flow_field=use_flow_field,
+                                    path_service=path_service, seed=seed)
+
+    # The number of ticks simulated
+    @property
+    def tick(self):
+        return self.grid.tick
+
+    # Applies one input to the player the same way key presses would
+    def apply_input(self, action, direction=None):
+        player = self.grid.player
+        if action == "press":
+            player.set_moving(direction, True)
+        elif action == "release":
+            player.set_moving(direction, False)
+        elif action == "throw":
+            if not player.is_dead:
+                player.throw_boomerang()
+
+    # Applies a key event the same way Game.process_events does
+    def apply_key_event(self, event_type, key):
+        event = pygame.event.Event(event_type, key=key)
+        player = self.grid.player
+        if event_type == pygame.KEYDOWN and key == pygame.K_SPACE and \
+                not player.is_dead:
+            player.throw_boomerang()
+        player.process_key_presses(event)
+
+    # Advances the simulation by a number of ticks
+    def step(self, ticks=1):
+        for _ in range(ticks):
+            self.grid.update_entities(self.delta_time)
+
+    # Checks if the level has ended with the player dying or exiting
+    def is_finished(self):
+        return self.grid.player.is_dead or bool(self.grid.player.on_exit)
+
+    # Plays the input script until the level ends or max_ticks pass and
+    # returns a summary of the outcome
+    def run(self, script=(), max_ticks=10000):
+        script = sorted(script, key=lambda entry: entry[0])
+        next_input = 0
+        while self.tick < max_ticks and not self.is_finished():
+            # Apply the inputs meant for this tick
+            while next_input < len(script) and \
+                    script[next_input][0] <= self.tick:
+                self.apply_input(*script[next_input][1:])
+                next_input += 1
+            self.step()
+        return self.get_result()
+
+    # Returns the state of the level as a dictionary
+    def get_result(self):
+        return {"map": self.current_map, **self.grid.get_summary()}
+
+
+# Runs a map from the command line and prints the outcome and speed
+def main(arguments):
+    if len(arguments) < 1:
+        print(__doc__.strip().splitlines()[-1])
+        return
+    script = load_input_script(arguments[1]) if len(arguments) > 1 else []
+    max_ticks = int(arguments[2]) if len(arguments) > 2 else 10000
+    game = HeadlessGame(arguments[0])
+    start_time = time.perf_counter()
+    result = game.run(script, max_ticks)
+    elapsed_time = time.perf_counter() - start_time
+    for key, value in result.items():
+        print(key + ":", value)
+    print("ticks per second: %.0f" % (result["ticks"] / max(elapsed_time,
+                                                             1e-9)))
+
+
+# Runs the simulation on run
+if __name__ == "__main__":
+    main(sys.argv[1:])
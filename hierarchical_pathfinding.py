@@ -0,0 +1,304 @@
+"""
+Mykyta S.
+hierarchical_pathfinding.py
+
+A module that contains hierarchical path finding (HPA*) for enemies chasing
+the player across large maps. The map is split into square clusters of
+CLUSTER_SIZE tiles. Wherever open tiles meet across the border of two
+clusters there is an entrance, and the number of steps between the
+entrances of each cluster is found once, so a long search only has to
+go from entrance to entrance instead of over every open tile on the way.
+Only the part of the path inside the first cluster is turned into steps,
+the rest is searched again once the enemy gets there.
+
+When tiles change (spikes toggling or chunks of a streamed level loading)
+only the clusters around them are marked and they are repaired before the
+next search.
+"""
+
+import math
+import heapq
+# My own modules
+import pathfinding
+from pathfinding import BFSNode
+from profiler import Profiler
+
+# Number of tiles along each side of a cluster
+CLUSTER_SIZE = 16
+# Open borders at least this long get an entrance at both ends instead of
+# one in the middle
+LONG_BORDER = 6
+
+
+# Entrances between clusters and the distances between the entrances of each
+# cluster. Enemies are not taken into account, only walls and armed spikes
+class ClusterGraph:
+
+    def __init__(self, grid, cluster_size=CLUSTER_SIZE):
+        self.grid = grid
+        self.cluster_size = cluster_size
+        self.rows = math.ceil(grid.height / cluster_size)
+        self.columns = math.ceil(grid.width / cluster_size)
+        # Pairs of (position, position) of open tiles facing each other
+        # across the border of two neighbouring clusters, by the pair of
+        # clusters ((row, column), (row, column)) in sorted order
+        self.borders = {}
+        # Entrance positions of every cluster
+        self.entrances = {}
+        # Steps between the entrances of the same cluster, and the entrances
+        # across a border (always one step away) of every entrance
+        self.intra_edges = {}
+        self.inter_edges = {}
+        # Clusters whose tiles changed since they were last repaired
+        self.dirty_clusters = {(row, column) for row in range(self.rows)
+                               for column in range(self.columns)}
+        self.repair()
+
+    # Returns the (row, column) of the cluster a position is in
+    def get_cluster(self, position):
+        return position[0] // self.cluster_size, \
+            position[1] // self.cluster_size
+
+    # Marks the clusters that tiles in a rectangle belong to as changed,
+    # including the neighbours of those on the edge of a cluster since the
+    # entrances between them may have changed too
+    def mark_dirty(self, row, column, rows=1, columns=1):
+        for cluster_row in range(max((row - 1) // self.cluster_size, 0),
+                                 min((row + rows) // self.cluster_size,
+                                     self.rows - 1) + 1):
+            for cluster_column in range(
+                    max((column - 1) // self.cluster_size, 0),
+                    min((column + columns) // self.cluster_size,
+                        self.columns - 1) + 1):
+                self.dirty_clusters.add((cluster_row, cluster_column))
+
+    # Finds the entrances again on the borders of the changed clusters and
+    # the distances between the entrances of every cluster whose entrances
+    # or tiles changed
+    def repair(self):
+        if len(self.dirty_clusters) == 0:
+            return
+        changed = set(self.dirty_clusters)
+        checked = set()
+        for row, column in self.dirty_clusters:
+            for neighbour in ((row - 1, column), (row + 1, column),
+                              (row, column - 1), (row, column + 1)):
+                if not (0 <= neighbour[0] < self.rows and
+                        0 <= neighbour[1] < self.columns):
+                    continue
+                key = min((row, column), neighbour), \
+                    max((row, column), neighbour)
+                if key in checked:
+                    continue
+                checked.add(key)
+                transitions = self.find_transitions(*key)
+                if transitions != self.borders.get(key, []):
+                    self.set_transitions(key, transitions)
+                    changed.add(neighbour)
+        for cluster in changed:
+            self.connect_entrances(cluster)
+        self.dirty_clusters.clear()
+
+    # Returns the pairs of open tiles facing each other across the border of
+    # two neighbouring clusters, one or two for every open stretch
+    def find_transitions(self, first, second):
+        size = self.cluster_size
+        width, passable = self.grid.width, self.grid.passable
+        if first[0] == second[0]:
+            # The second cluster is to the right, walk down the border
+            column = second[1] * size - 1
+            cells = [((row, column), (row, column + 1)) for row in range(
+                first[0] * size, min((first[0] + 1) * size,
+                                     self.grid.height))]
+        else:
+            # The second cluster is below, walk along the border
+            row = second[0] * size - 1
+            cells = [((row, column), (row + 1, column)) for column in range(
+                first[1] * size, min((first[1] + 1) * size,
+                                     self.grid.width))]
+        transitions = []
+        stretch = []
+        for cell in cells + [None]:
+            if cell is not None and \
+                    passable[cell[0][0] * width + cell[0][1]] and \
+                    passable[cell[1][0] * width + cell[1][1]]:
+                stretch.append(cell)
+                continue
+            if len(stretch) >= LONG_BORDER:
+                transitions.append(stretch[0])
+                transitions.append(stretch[-1])
+            elif len(stretch) > 0:
+                transitions.append(stretch[len(stretch) // 2])
+            stretch = []
+        return transitions
+
+    # Replaces the entrances on the border between two clusters
+    def set_transitions(self, key, transitions):
+        for position, other in self.borders.get(key, []):
+            self.inter_edges[position].discard(other)
+            self.inter_edges[other].discard(position)
+        self.borders[key] = transitions
+        for position, other in transitions:
+            self.inter_edges.setdefault(position, set()).add(other)
+            self.inter_edges.setdefault(other, set()).add(position)
+
+    # Finds the entrances of a cluster from its borders and the number of
+    # steps between every two of them that are connected inside it
+    def connect_entrances(self, cluster):
+        for position in self.entrances.get(cluster, ()):
+            self.intra_edges.pop(position, None)
+        row, column = cluster
+        entrances = set()
+        for neighbour in ((row - 1, column), (row + 1, column),
+                          (row, column - 1), (row, column + 1)):
+            key = min(cluster, neighbour), max(cluster, neighbour)
+            for pair in self.borders.get(key, ()):
+                for position in pair:
+                    if self.get_cluster(position) == cluster:
+                        entrances.add(position)
+        self.entrances[cluster] = entrances
+        area = self.get_area(cluster)
+        # Distances go both ways, so each entrance only searches for the
+        # ones after it
+        ordered = sorted(entrances)
+        for position in ordered:
+            self.intra_edges[position] = {}
+        for i, position in enumerate(ordered):
+            for other, distance in self.get_distances(
+                    position, ordered[i + 1:], area).items():
+                self.intra_edges[position][other] = distance
+                self.intra_edges[other][position] = distance
+
+    # Returns the top left position, the size and the passability (row by
+    # row) of the tiles of a cluster
+    def get_area(self, cluster):
+        top = cluster[0] * self.cluster_size
+        left = cluster[1] * self.cluster_size
+        rows = min(self.cluster_size, self.grid.height - top)
+        columns = min(self.cluster_size, self.grid.width - left)
+        width, passable = self.grid.width, self.grid.passable
+        tiles = bytearray()
+        for row in range(top, top + rows):
+            tiles += passable[row * width + left:row * width + left + columns]
+        return top, left, rows, columns, tiles
+
+    # Returns the number of steps from a position to each of the targets in
+    # its cluster that can be reached without leaving the cluster. The
+    # search goes one step further from all tiles at once and stops when
+    # every target was found
+    def get_distances(self, origin, targets, area=None):
+        top, left, rows, columns, tiles = \
+            area or self.get_area(self.get_cluster(origin))
+        # Targets by their index in the cluster
+        wanted = {(row - top) * columns + column - left: (row, column)
+                  for row, column in targets}
+        found = {}
+        start = (origin[0] - top) * columns + origin[1] - left
+        # Open tiles that weren't reached yet
+        unvisited = bytearray(tiles)
+        unvisited[start] = 0
+        size = len(unvisited)
+        frontier = [start]
+        distance = 0
+        while frontier and len(found) < len(wanted):
+            next_frontier = []
+            for index in frontier:
+                if index in wanted:
+                    found[wanted[index]] = distance
+                column = index % columns
+                neighbours = [index - columns, index + columns]
+                if column > 0:
+                    neighbours.append(index - 1)
+                if column < columns - 1:
+                    neighbours.append(index + 1)
+                for neighbour in neighbours:
+                    if 0 <= neighbour < size and unvisited[neighbour]:
+                        unvisited[neighbour] = 0
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+            distance += 1
+        return found
+
+    # Finds a path between two positions in different clusters from entrance
+    # to entrance and returns the steps up to the first tile outside of the
+    # start's cluster as a path of BFSNodes like a_star_search. Positions in
+    # the same cluster are searched with a_star_search
+    def find_path(self, start_pos, end_pos, enemy=None):
+        start_cluster = self.get_cluster(start_pos)
+        if start_cluster == self.get_cluster(end_pos):
+            return pathfinding.a_star_search(self.grid, start_pos, end_pos,
+                                             enemy)
+        self.repair()
+        start_edges = self.get_distances(
+            start_pos, self.entrances.get(start_cluster, ()))
+        end_edges = self.get_distances(
+            end_pos, self.entrances.get(self.get_cluster(end_pos), ()))
+
+        # A* over the entrances, entries are (estimated total, insertion
+        # order, distance, position)
+        open_heap = [(pathfinding.manhattan_distance(start_pos, end_pos), 0,
+                      0, start_pos)]
+        push_count = 1
+        best_distance = {start_pos: 0}
+        previous = {}
+        expanded = 0
+        while open_heap:
+            distance, position = heapq.heappop(open_heap)[2:]
+            if position == end_pos:
+                break
+            # Skip stale heap entries
+            if distance > best_distance[position]:
+                continue
+            expanded += 1
+            edges = [*self.intra_edges.get(position, {}).items(),
+                     *((other, 1) for other
+                       in self.inter_edges.get(position, ()))]
+            if position == start_pos:
+                edges.extend(start_edges.items())
+            if position in end_edges:
+                edges.append((end_pos, end_edges[position]))
+            for other, cost in edges:
+                new_distance = distance + cost
+                if best_distance.get(other, new_distance + 1) <= new_distance:
+                    continue
+                best_distance[other] = new_distance
+                previous[other] = position
+                heapq.heappush(open_heap, (
+                    new_distance +
+                    pathfinding.manhattan_distance(other, end_pos),
+                    push_count, new_distance, other))
+                push_count += 1
+
+        if Profiler.enabled:
+            Profiler.count("searches")
+            Profiler.count("nodes", expanded)
+        if end_pos not in previous:
+            return None
+        waypoints = [end_pos]
+        while waypoints[-1] != start_pos:
+            waypoints.append(previous[waypoints[-1]])
+        waypoints.reverse()
+        return self.refine(waypoints, start_cluster, enemy)
+
+    # Turns the waypoints inside the first cluster into steps, going around
+    # other enemies, and ends the path with the step out of the cluster
+    def refine(self, waypoints, cluster, enemy=None):
+        path = [BFSNode(0, waypoints[0])]
+        for waypoint in waypoints[1:]:
+            if self.get_cluster(waypoint) != cluster:
+                if pathfinding.can_pass_through(self.grid, waypoint,
+                                                enemy=enemy):
+                    path.append(BFSNode(path[-1].distance + 1, waypoint,
+                                        path[-1]))
+                break
+            steps = pathfinding.find_path(
+                path[-1].position, waypoint,
+                lambda position: self.get_cluster(position) == cluster and
+                pathfinding.can_pass_through(self.grid, position,
+                                             enemy=enemy))
+            if steps is None:
+                return None
+            for step in steps[1:]:
+                path.append(BFSNode(path[-1].distance + 1, step.position,
+                                    path[-1]))
+        return path
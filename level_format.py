@@ -0,0 +1,343 @@
+"""
+Mykyta S.
+level_format.py
+
+A module that contains the compiled binary level format and a cached loader
+for level data. LevelData holds everything the Grid needs to build a map: an
+array of tile kinds, tables of spikes, switches, corners and exits, and the
+spawn positions of the player, enemies and coins.
+
+Levels are read from a compiled .lvl file if there is one that is newer than
+the CSV file, otherwise the CSV file is parsed. Either way the result is kept
+in memory, so loading the same level again costs nothing.
+
+Huge CSV files without a compiled file are streamed instead: a StreamedLevel
+only indexes where the rows start and the Grid parses the chunks of the map
+around the player as it gets close to them.
+
+Binary layout (little endian):
+    header     magic "BLVL", version, width, height, table sizes, player
+    kinds      width * height bytes, one tile kind per cell
+    spikes     (cell index, is armed, name) for every spikes tile
+    switches   (cell index, name) for every switch
+    corners    (cell index, name) for every corner
+    exits      (cell index, name) for every exit
+    enemies    (row, column) for every enemy spawn
+    coins      (row, column) for every coin
+
+Usage: python level_format.py [level CSV files, all levels by default]
+"""
+
+import os
+import sys
+import glob
+import mmap
+import bisect
+import struct
+import itertools
+from array import array
+from collections import OrderedDict
+# My own module
+from tiles import TILE_EMPTY, TILE_WALL, TILE_CORNER, TILE_SPIKES, \
+    TILE_SWITCH, TILE_EXIT
+
+MAGIC = b"BLVL"
+VERSION = 1
+# Magic, version, width, height, numbers of spikes, switches, corners, exits,
+# enemies and coins, player row and column (NO_PLAYER if there is no player)
+HEADER = struct.Struct("<4sHHHIIIIIIHH")
+# Player position of levels without a player, never a row of a level since
+# heights are unsigned shorts too
+NO_PLAYER = 0xFFFF
+CELL_INDEX = struct.Struct("<IB")
+POSITION = struct.Struct("<HH")
+# Level CSV files this large are streamed instead of parsed all at once
+STREAM_SIZE = 1 << 20
+# Streamed levels remember where every this many values of a row start
+VALUE_STRIDE = 16
+
+# Levels that were already loaded, by file name and modification time
+level_cache = {}
+
+
+# Everything that is needed to build a map, without any game objects
+class LevelData:
+
+    def __init__(self, width=0, height=0):
+        self.width = width
+        self.height = height
+        # Cells missing from a CSV file are walls
+        self.kinds = bytearray([TILE_WALL]) * (width * height)
+        # Lists of (cell index, name) and (cell index, name, is armed)
+        self.spikes = []
+        self.switches = []
+        self.corners = []
+        self.exits = []
+        # Spawn positions as (row, column)
+        self.player = None
+        self.enemies = []
+        self.coins = []
+
+
+# Adds a value of a level CSV file at a cell to the tables of the level data
+# and returns its tile kind. The index is the cell on the whole map
+def parse_value(level, value, row, column, index):
+    # Add player and enemies
+    if value == "player":
+        level.player = row, column
+    elif value == "enemy":
+        level.enemies.append((row, column))
+    elif value == "coin":
+        level.coins.append((row, column))
+    # Pick a tile kind based on the name
+    if value == "wall":
+        return TILE_WALL
+    elif "spikes" in value:
+        is_armed = "unarmed" not in value
+        name = value if is_armed else value.split(" ")[0]
+        level.spikes.append((index, name, is_armed))
+        return TILE_SPIKES
+    elif "switch" in value:
+        level.switches.append((index, value))
+        return TILE_SWITCH
+    elif "corner" in value:
+        level.corners.append((index, value))
+        return TILE_CORNER
+    elif "exit" in value:
+        level.exits.append((index, value))
+        return TILE_EXIT
+    return TILE_EMPTY
+
+
+# Parses a level CSV file into LevelData
+def parse_csv(file_name):
+    rows = []
+    with open(file_name) as file:
+        for line in file:
+            if len(line.strip()) == 0:
+                rows.append([])
+                continue
+            rows.append([value.strip() for value in line.strip().split(",")])
+    height = max((row + 1 for row, values in enumerate(rows) if values),
+                 default=0)
+    width = max((len(values) for values in rows), default=0)
+    level = LevelData(width, height)
+
+    for row, values in enumerate(rows):
+        for column, value in enumerate(values):
+            index = row * width + column
+            level.kinds[index] = parse_value(level, value, row, column, index)
+    return level
+
+
+# A level CSV file that is parsed a part at a time when the Grid needs it.
+# Opening it only finds where every row starts, the size of the map and the
+# player, so huge maps can be shown without parsing all of their cells. The
+# file is memory mapped instead of read, so only the rows that were read
+# are brought into memory and the system can drop them again
+class StreamedLevel:
+
+    def __init__(self, file_name):
+        with open(file_name, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        # Offset of the start of every row, followed by the end of the data
+        self.row_offsets = array("q", [0])
+        offset = self.data.find(b"\n")
+        while offset >= 0:
+            self.row_offsets.append(offset + 1)
+            offset = self.data.find(b"\n", offset + 1)
+        if self.row_offsets[-1] != len(self.data):
+            self.row_offsets.append(len(self.data))
+        # For the max_cached_rows rows read most recently, where every
+        # VALUE_STRIDE-th value starts, followed by the end of the row
+        self.value_offsets = OrderedDict()
+        self.max_cached_rows = 512
+        self.width, self.height = 0, 0
+        for row in range(len(self.row_offsets) - 1):
+            line = self.data[self.row_offsets[row]:self.row_offsets[row + 1]]
+            if len(line.strip()) > 0:
+                self.width = max(self.width, line.count(b",") + 1)
+                self.height = row + 1
+        self.player = None
+        offset = self.data.find(b"player")
+        while offset >= 0:
+            row = bisect.bisect_right(self.row_offsets, offset) - 1
+            start, end = self.row_offsets[row], self.row_offsets[row + 1]
+            # Only a whole value counts, not a part of another name
+            value_start = self.data.rfind(b",", start, offset) + 1 or start
+            value_end = self.data.find(b",", offset, end)
+            if self.data[value_start:value_end if value_end >= 0 else end]\
+                    .strip() == b"player":
+                self.player = row, self.data[start:offset].count(b",")
+                break
+            offset = self.data.find(b"player", offset + 1)
+
+    # Returns where every VALUE_STRIDE-th value of a row starts, followed by
+    # the end of the row. The row is only split again after it was dropped
+    # from the rows kept
+    def get_value_offsets(self, row):
+        offsets = self.value_offsets.get(row)
+        if offsets is not None:
+            self.value_offsets.move_to_end(row)
+        else:
+            start, end = self.row_offsets[row], self.row_offsets[row + 1]
+            # Every value starts one byte after the end of the one before
+            starts = list(itertools.accumulate(
+                (len(value) + 1 for value in self.data[start:end].split(b",")),
+                initial=start))
+            offsets = array("q", starts[:-1:VALUE_STRIDE])
+            offsets.append(end)
+            self.value_offsets[row] = offsets
+            if len(self.value_offsets) > self.max_cached_rows:
+                self.value_offsets.popitem(last=False)
+        return offsets
+
+    # Parses the cells of a rectangle of the map into LevelData the size of
+    # the rectangle. Tables and spawns use positions on the whole map
+    def read_area(self, first_row, first_column, height, width):
+        height = max(min(height, self.height - first_row), 0)
+        width = max(min(width, self.width - first_column), 0)
+        level = LevelData(width, height)
+        first_block = first_column // VALUE_STRIDE
+        last_block = (first_column + width - 1) // VALUE_STRIDE
+        for row in range(first_row, first_row + height):
+            offsets = self.get_value_offsets(row)
+            if first_block >= len(offsets) - 1:
+                continue
+            # Only the values in the blocks of the rectangle are split
+            end = offsets[last_block + 1] - 1 \
+                if last_block + 2 < len(offsets) else offsets[-1]
+            line = self.data[offsets[first_block]:end].decode("utf-8")
+            if len(line.strip()) == 0:
+                continue
+            skipped = first_column - first_block * VALUE_STRIDE
+            values = line.split(",")[skipped:skipped + width]
+            for offset, value in enumerate(values):
+                column = first_column + offset
+                level.kinds[(row - first_row) * width + offset] = \
+                    parse_value(level, value.strip(), row, column,
+                                row * self.width + column)
+        return level
+
+
+# Encodes a name as a length byte followed by UTF-8 bytes
+def pack_name(name):
+    data = name.encode("utf-8")
+    return bytes([len(data)]) + data
+
+
+# Converts LevelData into the compiled binary format
+def pack_level(level):
+    player = level.player if level.player is not None \
+        else (NO_PLAYER, NO_PLAYER)
+    parts = [HEADER.pack(MAGIC, VERSION, level.width, level.height,
+                         len(level.spikes), len(level.switches),
+                         len(level.corners), len(level.exits),
+                         len(level.enemies), len(level.coins), *player),
+             bytes(level.kinds)]
+    for index, name, is_armed in level.spikes:
+        parts.append(CELL_INDEX.pack(index, is_armed) + pack_name(name))
+    for table in (level.switches, level.corners, level.exits):
+        for index, name in table:
+            parts.append(struct.pack("<I", index) + pack_name(name))
+    for table in (level.enemies, level.coins):
+        for row, column in table:
+            parts.append(POSITION.pack(row, column))
+    return b"".join(parts)
+
+
+# Reads LevelData from a compiled level file through a memory map
+def read_compiled(file_name):
+    with open(file_name, "rb") as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        magic, version, width, height, spike_count, switch_count, \
+            corner_count, exit_count, enemy_count, coin_count, \
+            player_row, player_column = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(file_name + " is not a compiled level file")
+        level = LevelData(width, height)
+        offset = HEADER.size
+        level.kinds = bytearray(data[offset:offset + width * height])
+        offset += width * height
+
+        # Reads a name at the offset and returns it with the next offset
+        def read_name(offset):
+            length = data[offset]
+            name = data[offset + 1:offset + 1 + length].decode("utf-8")
+            return name, offset + 1 + length
+
+        for _ in range(spike_count):
+            index, is_armed = CELL_INDEX.unpack_from(data, offset)
+            name, offset = read_name(offset + CELL_INDEX.size)
+            level.spikes.append((index, name, bool(is_armed)))
+        for table, count in ((level.switches, switch_count),
+                             (level.corners, corner_count),
+                             (level.exits, exit_count)):
+            for _ in range(count):
+                index = struct.unpack_from("<I", data, offset)[0]
+                name, offset = read_name(offset + 4)
+                table.append((index, name))
+        for table, count in ((level.enemies, enemy_count),
+                             (level.coins, coin_count)):
+            for _ in range(count):
+                table.append(POSITION.unpack_from(data, offset))
+                offset += POSITION.size
+        if player_row != NO_PLAYER:
+            level.player = player_row, player_column
+    return level
+
+
+# Returns the name of the compiled file for a level CSV file
+def get_compiled_name(file_name):
+    return os.path.splitext(file_name)[0] + ".lvl"
+
+
+# Converts a level CSV file into a compiled level file next to it
+def compile_level(file_name):
+    compiled_name = get_compiled_name(file_name)
+    with open(compiled_name, "wb") as file:
+        file.write(pack_level(parse_csv(file_name)))
+    return compiled_name
+
+
+# Returns the file a level is read from, its compiled file if that is up to
+# date and otherwise the CSV file
+def get_source_name(file_name):
+    compiled_name = get_compiled_name(file_name)
+    if os.path.exists(compiled_name) and \
+            (not os.path.exists(file_name) or
+             os.path.getmtime(compiled_name) >= os.path.getmtime(file_name)):
+        return compiled_name
+    return file_name
+
+
+# Returns the LevelData of a level file, from the cache if it was loaded
+# before. Prefers an up to date compiled file over parsing the CSV
+def load_level(file_name):
+    source_name = get_source_name(file_name)
+    key = source_name, os.path.getmtime(source_name)
+    level = level_cache.get(key)
+    if level is None:
+        if source_name != file_name:
+            level = read_compiled(source_name)
+        else:
+            level = parse_csv(file_name)
+        level_cache[key] = level
+    return level
+
+
+# Returns a StreamedLevel for a CSV file of at least STREAM_SIZE bytes that
+# has no up to date compiled file, and the LevelData of any other level.
+# Streamed levels aren't cached since opening them again is cheap
+def open_level(file_name):
+    if get_source_name(file_name) == file_name and \
+            os.path.getsize(file_name) >= STREAM_SIZE:
+        return StreamedLevel(file_name)
+    return load_level(file_name)
+
+
+# Compiles the level files given on the command line
+if __name__ == "__main__":
+    for argument in sys.argv[1:] or sorted(glob.glob(
+            os.path.join("levels", "*_map_data.csv"))):
+        print(argument + " -> " + compile_level(argument))
@@ -15,6 +15,11 @@ import pygame
 
 # Import my own modules (grid_world.py imports the rest)
 import grid_world
+from camera import Camera
+from sprite_registry import SpriteRegistry
+from replay import InputRecorder
+from text_cache import TextCache
+from profiler import Profiler, SECTIONS
 
 
 # Convert path to EXE file data location
@@ -32,7 +37,8 @@ def resource_path(relative_path):
 class Game:
 
     # Initialize permanent variables
-    def __init__(self, initial_map):
+    def __init__(self, initial_map, target_fps=60, record_file=None,
+                 scale_at_load=True):
         pygame.init()
         pygame.display.set_icon(pygame.image.load(
             resource_path("sprites/enemy.png")))
@@ -41,16 +47,50 @@ class Game:
         self.pixel_scale = 4
         self.size = self.width, self.height = \
             self.pixel_scale * 160, self.pixel_scale * 160
-        self.screen = pygame.display.set_mode(self.size)
+        pygame.display.set_mode(self.size)
+        # Either sprites are scaled up once when they are loaded and drawn
+        # straight onto the screen, updating only the parts that changed, or
+        # the map is drawn at its own size and scaled up every frame
+        self.scale_at_load = scale_at_load
+        # Parts of the screen drawn over the grid on the last frame
+        self.overlay_rects = []
+        # Maps larger than this many tiles scroll with the player
+        self.max_view_tiles = 20, 12
+        self.camera = None
+        self.full_redraw = True
+        # Load all sprites once the display format is known
+        SpriteRegistry.folder = resource_path("sprites")
+        SpriteRegistry.scale = self.pixel_scale if scale_at_load else 1
+        SpriteRegistry.warm_up()
         font_path = resource_path("assets/DisposableDroidBB.ttf")
         self.ui_font_big = pygame.font.Font(font_path, self.pixel_scale * 16)
         self.ui_font = pygame.font.Font(font_path, self.pixel_scale * 8)
+        # Text is only rendered again when it changes
+        self.text_cache = TextCache()
+        # The profiler overlay is toggled with F3 and rendered again every
+        # overlay_interval frames
+        self.profiler_font = pygame.font.Font(font_path, self.pixel_scale * 5)
+        self.show_profiler = False
+        self.profiler_overlay = None
+        self.overlay_interval = 30
         self.grid, self.surface, self.last_inputs = None, None, None
+        self.screen = None
         self.coin_count = 0
         self.throw_count = 0
         self.current_map = initial_map
         self.hint_text = []
+        # The simulation always advances in fixed steps of delta_time, as
+        # many as fit into the measured time of the last frame
         self.delta_time = 0.01
+        self.accumulated_time = 0
+        # At most this many steps per frame, the rest is skipped so that a
+        # slow frame can't make the next ones even slower
+        self.max_steps_per_frame = 10
+        # Frames per second to wait for, 0 renders as fast as possible
+        self.target_fps = target_fps
+        self.clock = pygame.time.Clock()
+        # Records the inputs of every attempt if a file is given
+        self.recorder = InputRecorder(record_file) if record_file else None
         # Load and play music
         pygame.mixer.music.load(resource_path("assets/music_compressed.ogg"))
         pygame.mixer.music.set_volume(0.25)
@@ -61,22 +101,53 @@ class Game:
     def load_map(self, map_name):
         if self.grid and self.grid.player:
             self.last_inputs = self.grid.player.movement_directions
+            if self.recorder:
+                self.recorder.finish_attempt(self.grid.get_summary())
         self.current_map = map_name
         map_data_path = resource_path("levels/" + map_name + "_map_data.csv")
-        self.grid = grid_world.Grid(map_data_path, 16)
-        self.surface = pygame.Surface((self.grid.width * self.grid.tile_size,
-                                       self.grid.height * self.grid.tile_size))
-        self.width, self.height = self.surface.get_rect().size
-        self.width *= self.pixel_scale
-        self.height *= self.pixel_scale
-        self.size = self.width, self.height
-        self.screen = pygame.display.set_mode(self.size)
+        self.grid = grid_world.Grid(map_data_path,
+                                    16 * SpriteRegistry.scale)
+        if self.recorder:
+            self.recorder.start_attempt(map_name, self.grid.seed)
+        view_tiles = min(self.grid.width, self.max_view_tiles[0]), \
+            min(self.grid.height, self.max_view_tiles[1])
+        surface_size = view_tiles[0] * 16, view_tiles[1] * 16
+        self.camera = Camera(view_tiles[0] * self.grid.tile_size,
+                             view_tiles[1] * self.grid.tile_size)
+        self.full_redraw = True
+        # Only recreate the window if the view has a different size
+        if self.screen is None or \
+                self.size != (surface_size[0] * self.pixel_scale,
+                              surface_size[1] * self.pixel_scale):
+            if not self.scale_at_load:
+                self.surface = pygame.Surface(surface_size)
+            self.width, self.height = surface_size
+            self.width *= self.pixel_scale
+            self.height *= self.pixel_scale
+            self.size = self.width, self.height
+            self.screen = pygame.display.set_mode(self.size)
+        self.overlay_rects = []
         self.hint_text = []
+        # Don't count the loading time as time to simulate
+        self.accumulated_time = 0
+        self.clock.tick()
         # Load text labels if necessary
         if "tutorial" in map_name or "the_end" in map_name:
             self.load_tutorial_text(map_name)
 
-    # Load text hints for the tutorial
+    # Restarts the current map from the state it was loaded in
+    def restart_map(self):
+        self.last_inputs = self.grid.player.movement_directions
+        if self.recorder:
+            self.recorder.finish_attempt(self.grid.get_summary())
+        self.grid.restore_snapshot()
+        self.accumulated_time = 0
+        self.full_redraw = True
+        if self.recorder:
+            self.recorder.start_attempt(self.current_map, self.grid.seed)
+
+    # Load text hints for the tutorial and render them once with their
+    # positions on the screen
     def load_tutorial_text(self, level_name):
         file_name = resource_path("levels/" + level_name + "_text.csv")
         self.hint_text = []
@@ -87,7 +158,10 @@ class Game:
                 hint = line.strip().split(",")
                 hint = hint[0].replace(";", ","), float(hint[1]) - 1, float(
                     hint[2]) - 1
-                self.hint_text.append(hint)
+                text = self.ui_font.render(hint[0], False, (255, 255, 255))
+                hint_pos = (hint[2] * 16 + 4) * self.pixel_scale, \
+                           (hint[1] * 16 + 4) * self.pixel_scale
+                self.hint_text.append((text, hint_pos))
 
     def display_level_info(self):
         # Display level name
@@ -106,49 +180,145 @@ class Game:
     # Process key presses and exits
     def process_events(self):
         for event in pygame.event.get():
+            if self.recorder:
+                self.recorder.record_event(self.grid.tick, event)
             # Exit when quit button is pressed
             if event.type == pygame.QUIT:
-                sys.exit()
+                self.quit()
             # Process the key down presses
             elif event.type == pygame.KEYDOWN:
                 # Throw the boomerang on space bar
                 if event.key == pygame.K_SPACE:
                     if self.grid.player.is_dead:
-                        self.load_map(self.current_map)
+                        self.restart_map()
                     else:
                         self.grid.player.throw_boomerang()
+                # Show or hide the profiler overlay on F3
+                elif event.key == pygame.K_F3:
+                    self.toggle_profiler()
 
             self.grid.player.process_key_presses(event)
 
     # Draws text on the top of the screen
     def draw_top_text(self, string, font: pygame.font.Font, space):
-        text = font.render(string, False, (255, 255, 255))
+        text = self.text_cache.render(font, string)
         text_rect = text.get_rect()
         coordinates = (0, 4 * self.pixel_scale)
-        self.screen.blit(text, (coordinates[0] + space, coordinates[1]))
+        self.overlay_rects.append(self.screen.blit(
+            text, (coordinates[0] + space, coordinates[1])))
         return space + text_rect.width + 16 * self.pixel_scale
 
     # Draws text in the middle
     def draw_middle_text(self, string, font: pygame.font.Font, space):
-        text = font.render(string, False, (255, 255, 255))
+        text = self.text_cache.render(font, string)
         text_rect = text.get_rect()
         coordinates = (self.width / 2 - text_rect.width / 2,
                        self.height / 2 - text_rect.height / 2)
-        self.screen.blit(text, (coordinates[0], coordinates[1] + space))
+        self.overlay_rects.append(self.screen.blit(
+            text, (coordinates[0], coordinates[1] + space)))
         return space + font.get_linesize() - 4 * self.pixel_scale
 
+    # Advances the simulation by the real time that has passed in fixed steps
+    def update_simulation(self):
+        # Measure the frame and wait for the target frame rate
+        if Profiler.enabled:
+            start = time.perf_counter()
+            frame_time = self.clock.tick(self.target_fps) / 1000
+            Profiler.lap("wait", start)
+        else:
+            frame_time = self.clock.tick(self.target_fps) / 1000
+        self.accumulated_time += frame_time
+        steps = 0
+        while self.accumulated_time >= self.delta_time:
+            # Skip the time that can't be caught up with
+            if steps == self.max_steps_per_frame:
+                self.accumulated_time = 0
+                break
+            self.grid.update_entities(self.delta_time)
+            self.accumulated_time -= self.delta_time
+            steps += 1
+        return steps
+
+    # Shows or hides the profiler overlay, the profiler keeps running while
+    # it is exporting
+    def toggle_profiler(self):
+        self.show_profiler = not self.show_profiler
+        self.profiler_overlay = None
+        Profiler.enabled = self.show_profiler or \
+            Profiler.export_file is not None
+
+    # Draws the average section times and counters of the latest frames
+    def draw_profiler_overlay(self):
+        if self.profiler_overlay is None or \
+                Profiler.frame % self.overlay_interval == 0:
+            averages = Profiler.get_averages()
+            lines = ["frame %.2f ms" % averages.get("total_ms", 0)]
+            for section in SECTIONS:
+                lines.append("%s %.2f ms" % (
+                    section, averages.get(section + "_ms", 0)))
+            lines.append("steps %.1f searches %.1f nodes %.0f" % (
+                averages.get("steps", 0), averages.get("searches", 0),
+                averages.get("nodes", 0)))
+            texts = [self.profiler_font.render(line, False, (255, 255, 0))
+                     for line in lines]
+            line_height = self.profiler_font.get_linesize()
+            self.profiler_overlay = pygame.Surface(
+                (max(text.get_width() for text in texts) +
+                 4 * self.pixel_scale,
+                 line_height * len(texts) + 4 * self.pixel_scale),
+                pygame.SRCALPHA)
+            self.profiler_overlay.fill((0, 0, 0, 160))
+            for i, text in enumerate(texts):
+                self.profiler_overlay.blit(
+                    text, (2 * self.pixel_scale,
+                           2 * self.pixel_scale + i * line_height))
+        self.overlay_rects.append(self.screen.blit(
+            self.profiler_overlay, (0, 16 * self.pixel_scale)))
+
     # The main procedure with game logic
     def game_loop(self):
+        profiling = Profiler.enabled
+        if profiling:
+            start = time.perf_counter()
         # Process keyboard input
         self.process_events()
+        if profiling:
+            Profiler.lap("events", start)
         # Update positions
-        self.grid.update_entities(self.delta_time)
-        # Draw everything on the screen
-        self.surface.fill((0, 0, 0))
-        self.grid.draw_grid(self.surface)
-        self.grid.draw_entities(self.surface)
-        # Scale up to fit the screen
-        pygame.transform.scale(self.surface, self.size, self.screen)
+        steps = self.update_simulation()
+        if profiling:
+            Profiler.count("steps", steps)
+            start = time.perf_counter()
+        # Draw everything the camera sees on the screen
+        camera_moved = self.camera.follow(self.grid)
+        if self.scale_at_load:
+            if camera_moved or self.full_redraw:
+                self.grid.draw_grid(self.screen, self.camera.rect)
+                changed_rects = [self.screen.get_rect()]
+                self.full_redraw = False
+            else:
+                # Cover last frame's entities and text
+                changed_rects = self.grid.draw_grid_areas(
+                    self.screen, self.overlay_rects, self.camera.rect)
+            if profiling:
+                start = Profiler.lap("draw_grid", start)
+            self.overlay_rects = self.grid.draw_entities(self.screen,
+                                                         self.camera.rect)
+            if profiling:
+                start = Profiler.lap("draw_entities", start)
+        else:
+            self.surface.fill((0, 0, 0))
+            self.grid.draw_grid(self.surface, self.camera.rect)
+            if profiling:
+                start = Profiler.lap("draw_grid", start)
+            self.grid.draw_entities(self.surface, self.camera.rect)
+            if profiling:
+                start = Profiler.lap("draw_entities", start)
+            # Scale up to fit the screen
+            pygame.transform.scale(self.surface, self.size, self.screen)
+            if profiling:
+                start = Profiler.lap("scale", start)
+            self.overlay_rects = []
         # Show coins and throws if the tutorial is finished
         if "tutorial_1" not in self.current_map:
             self.display_level_info()
@@ -157,14 +327,20 @@ class Game:
             line = self.draw_middle_text("Game Over", self.ui_font_big, 0)
             self.draw_middle_text("Press space to retry", self.ui_font, line)
         # Show tutorial tips
-        for hint in self.hint_text:
-            text = self.ui_font.render(hint[0], False, (255, 255, 255))
-            hint_pos = (hint[2] * 16 + 4) * self.pixel_scale, \
-                       (hint[1] * 16 + 4) * self.pixel_scale
-            self.screen.blit(text, hint_pos)
-        # Change the frame
-        pygame.display.flip()
-        time.sleep(0.01)
+        for text, hint_pos in self.hint_text:
+            self.overlay_rects.append(self.screen.blit(text, hint_pos))
+        if self.show_profiler:
+            self.draw_profiler_overlay()
+        if profiling:
+            start = Profiler.lap("text", start)
+        # Change the frame, only where it changed if possible
+        if self.scale_at_load:
+            pygame.display.update(changed_rects + self.overlay_rects)
+        else:
+            pygame.display.flip()
+        if profiling:
+            Profiler.lap("display", start)
+            Profiler.end_frame()
         # Next level
         if self.grid.player.on_exit:
             if "tutorial_1" not in self.current_map:
@@ -172,12 +348,26 @@ class Game:
                 self.throw_count += self.grid.player.throw_count
             next_level = self.grid.player.on_exit.get_next_level()
             if next_level is None:
-                sys.exit()
+                self.quit()
             self.load_map(next_level)
 
+    # Saves the recording if there is one and exits
+    def quit(self):
+        if self.recorder:
+            self.recorder.finish_attempt(self.grid.get_summary())
+        Profiler.stop_export()
+        sys.exit()
+
 
 # Starts the game on run
 if __name__ == "__main__":
-    game = Game("tutorial_1")
+    # Inputs are saved to a file for replay.py with --record file_name
+    record_file = None
+    if "--record" in sys.argv[:-1]:
+        record_file = sys.argv[sys.argv.index("--record") + 1]
+    # Frame timings are saved to a CSV or JSON lines file with --profile
+    if "--profile" in sys.argv[:-1]:
+        Profiler.start_export(sys.argv[sys.argv.index("--profile") + 1])
+    game = Game("tutorial_1", record_file=record_file)
     while True:
         game.game_loop()
@@ -10,23 +10,33 @@ PARENT CLASS    SUBCLASSES
 """
 
 import pygame
-import random
-# My own module
+# My own modules
 import pathfinding
+from sprite_registry import SpriteRegistry
+from tiles import TILE_WALL, TILE_CORNER, TILE_SPIKES, TILE_SWITCH, TILE_EXIT
+from directions import UP, DOWN, LEFT, RIGHT, DISPLACEMENTS, REVERSED, \
+    IS_VERTICAL
 
 
 # Defines basics of movement and rendering for each entity. All of them update
 # their position every frame and can move in a given direction with set_moving
 class MovingEntity:
+    __slots__ = ("grid", "speed", "sprite", "adjusting_trajectory", "row",
+                 "column", "movement_directions")
 
     def __init__(self, grid, row=0, column=0):
         self.grid = grid
-        self.row = row
-        self.column = column
         self.speed = 4
-        self.movement_directions = []
         self.sprite = None
         self.adjusting_trajectory = False
+        self.reset_state(row, column)
+
+    # Puts the entity at a position and resets everything that changes while
+    # playing, used when creating the entity and restarting the level
+    def reset_state(self, row, column):
+        self.row = row
+        self.column = column
+        self.movement_directions = []
 
     # Update position based on passed time
     def update(self, delta_time, step=64):
@@ -36,14 +46,15 @@ class MovingEntity:
             if self.adjusting_trajectory:
                 self.adjust_trajectory(direction)
 
-    # Makes the entity move in a given direction
+    # Makes the entity move in a given direction, or stop with None
     def set_moving(self, direction, condition=True):
         if direction is None:
             self.movement_directions = []
+            return
         if condition:
             if direction not in self.movement_directions:
                 self.movement_directions.insert(0, direction)
-            reversed_dir = MovingEntity.reverse(direction)
+            reversed_dir = REVERSED[direction]
             if reversed_dir in self.movement_directions:
                 self.movement_directions.remove(reversed_dir)
         elif direction in self.movement_directions:
@@ -51,14 +62,14 @@ class MovingEntity:
 
     # Move the entity in a given direction
     def move(self, direction, distance):
-        row_disp, column_disp = MovingEntity.dir_to_disp(direction)
+        row_disp, column_disp = DISPLACEMENTS[direction]
         self.row += row_disp * distance
         self.column += column_disp * distance
         return True
 
     # Adjust trajectory to stay on round coordinates
     def adjust_trajectory(self, direction):
-        if direction in ["up", "down"]:
+        if IS_VERTICAL[direction]:
             adjust = round(self.column) - self.column
             if abs(adjust) <= 0.01:
                 self.column = round(self.column)
@@ -91,43 +102,21 @@ class MovingEntity:
         return ((position[0] - other.row) ** 2 +
                 (position[1] - other.column) ** 2) ** .5
 
-    # Converts a direction string into displacement
-    @staticmethod
-    def dir_to_disp(direction):
-        row_displacement = 0
-        column_displacement = 0
-
-        if direction == "up":
-            row_displacement = -1
-        elif direction == "down":
-            row_displacement = 1
-        elif direction == "left":
-            column_displacement = -1
-        elif direction == "right":
-            column_displacement = 1
-
-        return row_displacement, column_displacement
-
-    # Reverses the given direction
-    @staticmethod
-    def reverse(direction):
-        if direction == "up":
-            return "down"
-        elif direction == "down":
-            return "up"
-        elif direction == "left":
-            return "right"
-        elif direction == "right":
-            return "left"
-
 
 # Contains all information about the player character in the game
 class Player(MovingEntity):
+    __slots__ = ("dead_sprite", "boomerang", "has_boomerang", "is_dead",
+                 "on_exit", "coin_count", "throw_count")
 
     def __init__(self, grid, row=0, column=0):
         super().__init__(grid, row, column)
         self.speed = 4
-        self.sprite = pygame.image.load("sprites/player.png")
+        self.sprite = SpriteRegistry.get_sprite("player")
+        self.dead_sprite = SpriteRegistry.get_rotated_sprite("player", 90)
+
+    # Resets the position and the player's progress in the level
+    def reset_state(self, row, column):
+        super().reset_state(row, column)
         self.boomerang = None
         self.has_boomerang = True
         self.is_dead = False
@@ -144,15 +133,14 @@ class Player(MovingEntity):
 
     # Updates active tiles such as spikes and switches
     def update_with_tiles(self):
-        tiles = self.grid.active_tiles
-        for tile in tiles:
-            if "spikes" in tile.name:
-                spikes = tile
-                if spikes.is_armed and self.distance_to(spikes) < 0.5:
-                    self.kill()
-            elif "exit" in tile.name:
-                if self.distance_to(tile) < 0.2 and self.has_boomerang:
-                    self.on_exit = tile
+        for spikes in self.grid.get_active_tiles_near(self.row, self.column,
+                                                      TILE_SPIKES, 0.5):
+            if spikes.is_armed:
+                self.kill()
+        for tile in self.grid.get_active_tiles_near(self.row, self.column,
+                                                    TILE_EXIT, 0.2):
+            if self.has_boomerang:
+                self.on_exit = tile
 
     # Sets it moving in the needed direction
     def set_moving(self, direction, condition=True):
@@ -161,17 +149,15 @@ class Player(MovingEntity):
     # Tries to move the player in a given direction, returns True if succeeds
     def move(self, direction, distance):
 
-        row_disp, column_disp = MovingEntity.dir_to_disp(direction)
+        row_disp, column_disp = DISPLACEMENTS[direction]
         adjacent_tile = round(self.row + row_disp / 2), \
                         round(self.column + column_disp / 2)
 
         # If it's empty, go there
-        tile = self.grid.get_tile_at(*adjacent_tile)
-        if "wall" not in tile.name:
-            if row_disp != 0 or column_disp != 0:
-                self.row += row_disp * distance
-                self.column += column_disp * distance
-                return True
+        if self.grid.get_kind_at(*adjacent_tile) != TILE_WALL:
+            self.row += row_disp * distance
+            self.column += column_disp * distance
+            return True
         # Else stay where you are
         return False
 
@@ -184,13 +170,13 @@ class Player(MovingEntity):
         else:
             return
         if event.key == pygame.K_LEFT or event.key == ord('a'):
-            self.set_moving("left", condition)
+            self.set_moving(LEFT, condition)
         if event.key == pygame.K_RIGHT or event.key == ord('d'):
-            self.set_moving("right", condition)
+            self.set_moving(RIGHT, condition)
         if event.key == pygame.K_UP or event.key == ord('w'):
-            self.set_moving("up", condition)
+            self.set_moving(UP, condition)
         if event.key == pygame.K_DOWN or event.key == ord('s'):
-            self.set_moving("down", condition)
+            self.set_moving(DOWN, condition)
 
     # Checks if the boomerang was thrown
     def boomerang_in_air(self):
@@ -218,7 +204,7 @@ class Player(MovingEntity):
     def draw_sprite(self) -> (pygame.Surface, pygame.Rect):
         # Turn the character over if it's dead
         if self.is_dead:
-            return pygame.transform.rotate(self.sprite, 90), self.get_rect()
+            return self.dead_sprite, self.get_rect()
         return super().draw_sprite()
 
     # When hit by an enemy
@@ -227,12 +213,15 @@ class Player(MovingEntity):
 
 
 class Boomerang(MovingEntity):
+    __slots__ = ("rotated_sprites", "rotated_sprites45", "rotation")
 
     # Initializes all the needed variables
     def __init__(self, grid, row=0, column=0):
         super().__init__(grid, row, column)
-        self.sprite = pygame.image.load("sprites/boomerang.png")
-        self.sprite45 = pygame.image.load("sprites/boomerang-45.png")
+        self.sprite = SpriteRegistry.get_sprite("boomerang")
+        # Rotations of the straight and the diagonal sprite
+        self.rotated_sprites = SpriteRegistry.get_rotations("boomerang")
+        self.rotated_sprites45 = SpriteRegistry.get_rotations("boomerang-45")
         self.speed = 7
         self.rotation = 0
         self.adjusting_trajectory = True
@@ -246,100 +235,91 @@ class Boomerang(MovingEntity):
         has_moved = self.move(last_dir, rounded_distance)
         if has_moved:
             self.adjust_trajectory(last_dir)
-        next_tile, next_pos = self.get_next_tile(last_dir)
-        if self.collides_with(next_tile, next_pos):
+        next_kind, next_pos = self.get_next_tile(last_dir)
+        if self.collides_with(next_kind, next_pos):
             # If it collided with something, reverse direction
-            if "corner" in next_tile.name:
-                new_dir = self.corner_bounce(last_dir, next_tile.name)
+            if next_kind == TILE_CORNER:
+                new_dir = self.corner_bounce(
+                    last_dir, self.grid.get_tile_at(*next_pos))
             else:
-                new_dir = self.reverse(last_dir)
+                new_dir = REVERSED[last_dir]
             self.set_moving(last_dir, False)
             self.set_moving(new_dir, True)
         self.update_with_tiles()
 
     # Updates active tiles such as spikes and switches
     def update_with_tiles(self):
-        tiles = self.grid.active_tiles
-        for tile in tiles:
-            if "switch" in tile.name:
-                switch = tile
-                if self.distance_to(switch) < 0.1:
-                    self.bounce()
-                    switch.toggle()
+        for switch in self.grid.get_active_tiles_near(self.row, self.column,
+                                                      TILE_SWITCH, 0.1):
+            self.bounce()
+            switch.toggle()
 
     # Bounce the boomerang off an enemy
     def bounce(self):
         last_dir = self.movement_directions[0]
-        new_dir = self.reverse(last_dir)
+        new_dir = REVERSED[last_dir]
         self.set_moving(last_dir, False)
         self.set_moving(new_dir, True)
 
-    # Bounce off a corner
-    def corner_bounce(self, direction: str, corner_name: str):
-        init_dir_letter = direction[0].upper()
-        # If coming to a flat side, then reverse
-        if init_dir_letter not in corner_name:
-            return self.reverse(direction)
-        # Else find the other direction to go
-        else:
-            new_dir_letter = corner_name.removeprefix("corner") \
-                .replace(init_dir_letter, "")
-            for direction in ["up", "down", "left", "right"]:
-                if new_dir_letter.lower() in direction:
-                    return self.reverse(direction)
+    # Bounce off a corner, turning on its turning sides and reversing on the
+    # flat ones
+    def corner_bounce(self, direction, corner):
+        return corner.bounces[direction]
 
-    # Returns the next tile according to movement in this direction
+    # Returns the kind and position of the next tile according to movement in
+    # this direction
     def get_next_tile(self, direction):
-        row_disp, column_disp = MovingEntity.dir_to_disp(direction)
+        row_disp, column_disp = DISPLACEMENTS[direction]
         adjacent_tile = round(self.row + row_disp / 2), \
                         round(self.column + column_disp / 2)
-        return self.grid.get_tile_at(*adjacent_tile), adjacent_tile
+        return self.grid.get_kind_at(*adjacent_tile), adjacent_tile
 
     # Tries to move the boomerang in a given direction, returns None if succeeds
     def move(self, direction, distance):
 
-        row_disp, column_disp = MovingEntity.dir_to_disp(direction)
-        next_tile, next_tile_pos = self.get_next_tile(direction)
+        row_disp, column_disp = DISPLACEMENTS[direction]
+        next_kind, next_tile_pos = self.get_next_tile(direction)
 
         # If it's empty, go there
-        if next_tile.name != "wall":
-            if row_disp != 0 or column_disp != 0:
-                self.row += row_disp * distance
-                self.column += column_disp * distance
-                return True
+        if next_kind != TILE_WALL:
+            self.row += row_disp * distance
+            self.column += column_disp * distance
+            return True
         # Else stay where you are
         return False
 
     # Redraws the boomerang's sprite and returns it
     def draw_sprite(self) -> (pygame.Surface, pygame.Rect):
         # Calculate the angle of rotation (0, 45, 90, 135 etc.)
-        angle_step = 45
-        rounded_rotation = (self.rotation // angle_step) * angle_step
-        sprite = self.sprite if rounded_rotation % 10 == 0 else self.sprite45
-        rounded_rotation = (rounded_rotation // 90) * 90
-        # Rotate and draw the sprite
-        rotated_sprite = pygame.transform.rotate(sprite, rounded_rotation)
+        angle_step = (self.rotation // 45) % 8
+        # Odd steps use the diagonal sprite, both are rotated by 90 degrees
+        # for every two steps
+        if angle_step % 2 == 0:
+            rotated_sprite = self.rotated_sprites[angle_step // 2]
+        else:
+            rotated_sprite = self.rotated_sprites45[angle_step // 2]
         rotated_rect = rotated_sprite.get_rect(center=self.get_rect().center)
         self.rotation += 5
         return rotated_sprite, rotated_rect
 
-    # Checks for collision with a tile
-    def collides_with(self, tile, tile_pos, position=None):
+    # Checks for collision with a tile of the given kind
+    def collides_with(self, kind, tile_pos, position=None):
         if position is None:
             position = self.row, self.column
         my_row, my_column = position
         tile_row, tile_column = tile_pos
         # If it's a wall
-        if "wall" in tile.name:
+        if kind == TILE_WALL:
             if tile_row + 1 < my_row or tile_row > my_row + 1:
                 return False
             if tile_column + 1 < my_column or tile_column > my_column + 1:
                 return False
             return True
         # If it's a corner
-        elif "corner" in tile.name:
+        elif kind == TILE_CORNER:
+            corner = self.grid.get_tile_at(*tile_pos)
             if len(self.movement_directions) != 0 and \
-                    self.movement_directions[0][0].upper() not in tile.name:
+                    self.movement_directions[0] not in corner.sides:
                 if tile_row + 1 < my_row or tile_row > my_row + 1:
                     return False
                 if tile_column + 1 < my_column or tile_column > my_column + 1:
@@ -353,15 +333,24 @@ class Boomerang(MovingEntity):
 
 # Defines a simple enemy
 class Enemy(MovingEntity):
+    __slots__ = ("dead_sprite", "is_dead", "last_path", "last_path_self",
+                 "last_path_player", "last_path_version", "movement_goal",
+                 "waiting")
 
     # Sets the required variables
     def __init__(self, grid, row=0, column=0):
         super().__init__(grid, row, column)
-        self.sprite = pygame.image.load("sprites/enemy.png")
+        self.sprite = SpriteRegistry.get_sprite("enemy")
+        self.dead_sprite = SpriteRegistry.get_rotated_sprite("enemy", 90)
         self.speed = 2
+
+    # Resets the position, brings the enemy back to life and forgets its path
+    def reset_state(self, row, column):
+        super().reset_state(row, column)
         self.is_dead = False
         self.last_path = None
         self.last_path_self, self.last_path_player = None, None
+        self.last_path_version = 0
         self.movement_goal = None
         self.waiting = 0
 
@@ -386,10 +375,10 @@ class Enemy(MovingEntity):
                                   (self_pos[0] - 1, self_pos[1]),
                                   (self_pos[0], self_pos[1] + 1),
                                   (self_pos[0], self_pos[1] - 1), *[None] * 2]\
-                [random.randrange(6)]
+                [self.grid.random.randrange(6)]
             # If the goal is to wait, start the timer
             if not self.movement_goal:
-                self.waiting = random.random() * 1
+                self.waiting = self.grid.random.random() * 1
             elif not pathfinding.can_pass_through(self.grid,
                                                   self.movement_goal,
                                                   enemy=self,
@@ -399,117 +388,201 @@ class Enemy(MovingEntity):
         # Move towards the goal
         if self.movement_goal:
             if self.movement_goal[1] + 0.05 < self.column:
-                self.set_moving("left")
+                self.set_moving(LEFT)
             elif self.movement_goal[1] - 0.05 > self.column:
-                self.set_moving("right")
+                self.set_moving(RIGHT)
             if self.movement_goal[0] + 0.05 < self.row:
-                self.set_moving("up")
+                self.set_moving(UP)
             elif self.movement_goal[0] - 0.05 > self.row:
-                self.set_moving("down")
+                self.set_moving(DOWN)
             self.last_path = self.last_path
         else:
             self.set_moving(None)
-        # Die if hit by boomerang
-        if not self.grid.player.has_boomerang:
-            if self.distance_to(self.grid.player.boomerang) < 0.7:
-                self.is_dead = True
-                self.grid.player.boomerang.bounce()
-                self.grid.coins.append(Coin(self.grid,
-                                            round(self.row),
-                                            round(self.column)))
-                return
-        # Kill the player on touch
-        if self.distance_to(self.grid.player) < 0.7:
-            self.grid.player.kill()
         # Update with active tiles
         self.update_with_tiles()
         super().update(delta_time, step)
+        self.grid.enemy_index.update(self)
 
     # Updates the current saved path with new information
     def update_path(self, force_update=False):
         player_pos = round(self.grid.player.row), \
                      round(self.grid.player.column)
         self_pos = round(self.row), round(self.column)
+        service = None if self.grid.use_flow_field else self.grid.path_service
+        if service is not None:
+            # Pick up a path found in the background
+            is_done, path = service.collect(self)
+            if is_done:
+                self.last_path = path
+            self.trim_path(self_pos)
         if force_update or not self.last_path_self or (
                 self.last_path is not None and
                 (self.last_path_self != self_pos or
-                 self.last_path_player != player_pos)):
-            self.last_path = pathfinding \
-                .breadth_first_search(self.grid, self_pos, player_pos, self)
+                 self.last_path_player != player_pos)) or (
+                self.grid.use_flow_field and
+                (self.last_path_version != self.grid.passability_version or
+                 # The field is rebuilt when the player moves, which may
+                 # bring an enemy that was out of its range into it
+                 (self.last_path is None and
+                  self.last_path_player != player_pos))):
+            if self.grid.use_flow_field:
+                # Take the next step from the field shared by all enemies
+                self.last_path = pathfinding.follow_distance_field(
+                    self.grid, self.grid.get_flow_field(), self_pos, self)
+            elif service is not None:
+                # A forced update replaces a running search, otherwise wait
+                # for it to finish and then check again
+                if force_update:
+                    service.forget([self])
+                elif service.is_pending(self):
+                    return
+                service.request(self.grid, self, self_pos, player_pos)
+            elif self.grid.cluster_graph is not None and \
+                    pathfinding.manhattan_distance(self_pos, player_pos) >= \
+                    self.grid.hierarchical_distance:
+                # Long chases go from cluster to cluster
+                self.last_path = self.grid.cluster_graph \
+                    .find_path(self_pos, player_pos, self)
+            else:
+                self.last_path = self.find_cached_path(self_pos, player_pos)
         self.last_path_player = player_pos
         self.last_path_self = self_pos
+        self.last_path_version = self.grid.passability_version
+
+    # Returns a path to the player made from the paths of the grid's cache,
+    # which don't go around other enemies, searching again around them only
+    # if one of them is on the next step
+    def find_cached_path(self, self_pos, player_pos):
+        positions = self.grid.path_cache.find_path(
+            self_pos, player_pos, self.grid.passability_version,
+            lambda start_pos, end_pos: pathfinding.find_positions(
+                self.grid, start_pos, end_pos))
+        if positions is None:
+            return None
+        if len(positions) > 1 and not pathfinding.can_pass_through(
+                self.grid, positions[1], enemy=self):
+            return pathfinding.a_star_search(self.grid, self_pos, player_pos,
+                                             self)
+        return pathfinding.path_from_positions(positions)
+
+    # Removes the steps of the saved path that are already behind the enemy
+    def trim_path(self, self_pos):
+        if not self.last_path or self.last_path[0].position == self_pos:
+            return
+        for i, node in enumerate(self.last_path):
+            if node.position == self_pos:
+                self.last_path = self.last_path[i:]
+                return
+
+    # Checks if the saved path goes through changed tiles, or if going
+    # through one of the newly opened tiles could be shorter
+    def is_path_affected(self, changed, opened, player_pos):
+        if self.last_path is None:
+            return True
+        for node in self.last_path:
+            if node.position in changed:
+                return True
+        self_pos = round(self.row), round(self.column)
+        path_length = len(self.last_path) - 1
+        for position in opened:
+            if pathfinding.manhattan_distance(self_pos, position) + \
+                    pathfinding.manhattan_distance(position, player_pos) < \
+                    path_length:
+                return True
+        return False
 
     # Updates active tiles such as spikes
     def update_with_tiles(self):
-        tiles = self.grid.active_tiles
-        for tile in tiles:
-            if "spikes" in tile.name:
-                spikes = tile
-                if spikes.is_armed and self.distance_to(spikes) < 0.5:
-                    self.is_dead = True
-                    self.grid.coins.append(Coin(self.grid,
-                                                round(self.row),
-                                                round(self.column)))
+        for spikes in self.grid.get_active_tiles_near(self.row, self.column,
+                                                      TILE_SPIKES, 0.5):
+            if spikes.is_armed:
+                self.kill()
 
     # Tries to move the player in a given direction, returns True if succeeds
     def move(self, direction, distance):
 
-        row_disp, column_disp = MovingEntity.dir_to_disp(direction)
+        row_disp, column_disp = DISPLACEMENTS[direction]
         adjacent_tile = round(self.row + row_disp / 2), \
                         round(self.column + column_disp / 2)
 
-        # If it's not empty, stay
-        tile = self.grid.get_tile_at(*adjacent_tile)
-        if "wall" in tile.name:
-            return False
-        if "spikes" in tile.name and tile.is_armed:
+        # If it's not empty, stay (walls and armed spikes)
+        if not self.grid.is_passable(*adjacent_tile):
             return False
         # Avoid other enemies
-        new_position = (self.row + row_disp * distance,
-                        self.column + column_disp * distance)
-        for e in self.grid.enemies:
-            if e is not self and not e.is_dead and \
-                    self.distance_to(e, new_position) < 0.7:
-                return False
+        if self.grid.enemy_index.is_occupied(self.row + row_disp * distance,
+                                             self.column +
+                                             column_disp * distance,
+                                             0.7, ignore=self):
+            return False
 
         # If it's empty, go there
-        if row_disp != 0 or column_disp != 0:
-            self.row += row_disp * distance
-            self.column += column_disp * distance
-            return True
+        self.row += row_disp * distance
+        self.column += column_disp * distance
+        return True
+
+    # When hit by the boomerang or spikes, leaves a coin behind
+    def kill(self):
+        self.is_dead = True
+        self.grid.enemy_index.remove(self)
+        self.grid.add_coin(round(self.row), round(self.column))
 
     # Draws the enemy sprite
     def draw_sprite(self) -> (pygame.Surface, pygame.Rect):
         # Turn the character over if it's dead
         if self.is_dead:
-            return pygame.transform.rotate(self.sprite, 90), self.get_rect()
+            return self.dead_sprite, self.get_rect()
         return super().draw_sprite()
 
 
-# Defines pick-up-able coins
+# Defines pick-up-able coins. Coins don't move, so their position and
+# animation live in the grid's coin store and are never updated one by one
 class Coin(MovingEntity):
+    __slots__ = ("slot", "last_position", "sprites", "animation_speed")
 
     # Initialize the coin
     def __init__(self, grid, row=0, column=0):
+        self.slot = None
         super().__init__(grid, row, column)
-        self.sprites = [pygame.image.load("sprites/coin_1.png"),
-                        pygame.image.load("sprites/coin_2.png"),
-                        pygame.image.load("sprites/coin_3.png"),
-                        pygame.image.load("sprites/coin_4.png")]
+        self.sprites = SpriteRegistry.get_sprites(["coin_1", "coin_2",
+                                                   "coin_3", "coin_4"])
         self.speed = 0
-        self.animation_progress = 0
         self.animation_speed = 5
-        self.is_picked_up = False
 
-    def update(self, delta_time, step=64):
-        if self.is_picked_up:
-            return
-        super().update(delta_time, step)
-        self.animation_progress += delta_time * self.animation_speed
-        # Add to score if touches player
-        if self.distance_to(self.grid.player) < 0.7:
-            self.is_picked_up = True
-            self.grid.player.coin_count += 1
+    # Puts the coin back on the map at a position with a new animation
+    def reset_state(self, row, column):
+        self.movement_directions = []
+        if self.slot is not None:
+            self.grid.coins.remove(self)
+        self.grid.coins.add(self, row, column)
+
+    # Picked up coins stay where they were last
+    @property
+    def row(self):
+        if self.slot is None:
+            return self.last_position[0]
+        return self.grid.coins.rows[self.slot]
+
+    @property
+    def column(self):
+        if self.slot is None:
+            return self.last_position[1]
+        return self.grid.coins.columns[self.slot]
+
+    @property
+    def is_picked_up(self):
+        return self.slot is None
+
+    @property
+    def animation_progress(self):
+        if self.slot is None:
+            return 0
+        return self.grid.coins.get_age(self.slot) * self.animation_speed
+
+    # When touched by the player, adds to the score
+    def pick_up(self):
+        self.grid.player.coin_count += 1
+        self.grid.coin_index.remove(self)
+        self.grid.coins.remove(self)
 
     # Draw the coin
     def draw_sprite(self) -> (pygame.Surface, pygame.Rect):
@@ -0,0 +1,137 @@
+"""
+Mykyta S.
+path_cache.py
+
+A module that contains a cache of enemy paths. Enemies search for a new path
+every time they or the player move a tile, but the new path is almost always
+a part of the old one or the old one with a step added at the end, so paths
+are kept by (start, goal, passability version) and reused:
+
+    a path from any tile of a cached path to its goal is the rest of that
+        path, which covers an enemy that walked along its path and enemies
+        that meet the path of another enemy chasing the same goal
+    when the goal moved to a neighbouring tile, a path to the old goal gets
+        the new goal added at its end (or is cut short if it already went
+        through the new goal), at most max_patches times in a row before
+        searching again
+
+Cached paths don't go around other enemies. Everything is forgotten when the
+passability changes, since the paths of older versions can't be used again.
+"""
+
+from collections import OrderedDict
+
+
+# Keeps the positions of recently found paths, dropping the ones that were
+# used least recently when there are too many
+class PathCache:
+
+    def __init__(self, max_size=256, max_patches=8):
+        self.max_size = max_size
+        self.max_patches = max_patches
+        # (positions, number of patches in a row) by (start, goal, version),
+        # the most recent last
+        self.paths = OrderedDict()
+        # For each (goal, version), the key of a cached path through every
+        # position and where in that path the position is
+        self.positions = {}
+        self.version = None
+        # Metrics
+        self.hits = 0
+        self.suffix_hits = 0
+        self.patches = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Returns the positions of a path from start to goal, using search(start,
+    # goal) to find it if it can't be made from the cached paths. Returns
+    # None if there is no path
+    def find_path(self, start, goal, version, search):
+        if version != self.version:
+            self.clear()
+            self.version = version
+        key = start, goal, version
+        entry = self.paths.get(key)
+        if entry is not None:
+            self.paths.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        entry = self.get_suffix(start, goal, version)
+        if entry is not None:
+            self.suffix_hits += 1
+            return entry[0]
+        entry = self.patch_goal(start, goal, version)
+        if entry is not None:
+            self.patches += 1
+            self.add(key, *entry)
+            return entry[0]
+        self.misses += 1
+        positions = search(start, goal)
+        if positions is None:
+            return None
+        self.add(key, tuple(positions), 0)
+        return self.paths[key][0]
+
+    # Returns (positions, patches) of the rest of a cached path to the goal
+    # that goes through the start, or None if there is none
+    def get_suffix(self, start, goal, version):
+        location = self.positions.get((goal, version), {}).get(start)
+        if location is None:
+            return None
+        key, offset = location
+        self.paths.move_to_end(key)
+        positions, patches = self.paths[key]
+        return positions[offset:], patches
+
+    # Returns (positions, patches) of a cached path from the start to a
+    # neighbour of the goal with the goal added to its end, or None if there
+    # is none or it was patched too many times in a row already
+    def patch_goal(self, start, goal, version):
+        for old_goal in ((goal[0] + 1, goal[1]), (goal[0] - 1, goal[1]),
+                         (goal[0], goal[1] + 1), (goal[0], goal[1] - 1)):
+            entry = self.get_suffix(start, old_goal, version)
+            if entry is None or entry[1] >= self.max_patches:
+                continue
+            positions, patches = entry
+            # Going back along the path only cuts it short
+            if goal in positions:
+                return positions[:positions.index(goal) + 1], patches + 1
+            return positions + (goal,), patches + 1
+        return None
+
+    # Adds a path and indexes its positions, dropping the least recently
+    # used path if there are too many
+    def add(self, key, positions, patches):
+        self.paths[key] = positions, patches
+        index = self.positions.setdefault((key[1], key[2]), {})
+        for offset, position in enumerate(positions):
+            index[position] = key, offset
+        if len(self.paths) > self.max_size:
+            self.remove(next(iter(self.paths)))
+            self.evictions += 1
+
+    # Removes a path and the positions that lead to it
+    def remove(self, key):
+        positions = self.paths.pop(key)[0]
+        index = self.positions[(key[1], key[2])]
+        for position in positions:
+            if index.get(position, (None,))[0] == key:
+                del index[position]
+        if len(index) == 0:
+            del self.positions[(key[1], key[2])]
+
+    # Removes every cached path, keeping the metrics
+    def clear(self):
+        self.paths.clear()
+        self.positions.clear()
+
+    # Returns the hit rate and the number of each kind of lookup
+    def get_metrics(self):
+        lookups = self.hits + self.suffix_hits + self.patches + self.misses
+        return {"hit_rate": (lookups - self.misses) / max(lookups, 1),
+                "hits": self.hits,
+                "suffix_hits": self.suffix_hits,
+                "patches": self.patches,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self.paths)}
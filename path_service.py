@@ -0,0 +1,207 @@
+"""
+Mykyta S.
+path_service.py
+
+A module that contains a service for finding enemy paths in the background.
+Searches run on a thread or process pool over a copy of the map's
+passability, so the game loop only hands out requests and picks up finished
+paths on later ticks. Enemies keep following their old path in the meantime.
+
+Worker processes keep the last copy they were sent, so a copy only goes to
+each process once every time the passability changes instead of with every
+request.
+"""
+
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+# My own module
+import pathfinding
+
+# Only enemies this close block the tiles of a searched path, farther ones
+# will have moved by the time the enemy gets there
+BLOCK_DISTANCE = 8
+# Returned by a worker process that doesn't have the snapshot of a request
+MISSING_SNAPSHOT = "missing snapshot"
+# The number and the snapshot a worker process was sent last
+worker_snapshot = (None, None)
+
+
+# A copy of which tiles enemies can walk on, safe to share between workers
+class PassabilitySnapshot:
+
+    def __init__(self, grid):
+        self.width = grid.width
+        self.height = grid.height
+        self.passable = bytes(grid.passable)
+
+    # Checks if a position can be walked on and isn't blocked
+    def is_passable(self, position, blocked):
+        row, column = position
+        if 0 <= row < self.height and 0 <= column < self.width:
+            return self.passable[row * self.width + column] and \
+                   position not in blocked
+        return False
+
+
+# Finds a path on a snapshot and returns it as a list of positions
+def solve(snapshot, blocked, start_pos, end_pos):
+    path = pathfinding.find_path(
+        start_pos, end_pos,
+        lambda position: snapshot.is_passable(position, blocked))
+    if path is None:
+        return None
+    return [node.position for node in path]
+
+
+# Finds a path in a worker process on the snapshot of a number. Only the
+# first requests after the snapshot changed carry it, the others use the
+# one the process kept, or return MISSING_SNAPSHOT if it never got it
+def solve_in_process(snapshot_number, snapshot, blocked, start_pos, end_pos):
+    global worker_snapshot
+    if snapshot is not None:
+        worker_snapshot = snapshot_number, snapshot
+    elif worker_snapshot[0] != snapshot_number:
+        return MISSING_SNAPSHOT
+    return solve(worker_snapshot[1], blocked, start_pos, end_pos)
+
+
+# Returns the tiles that are too close to other enemies near this one to walk
+# on, the same tiles can_pass_through avoids for this enemy
+def get_blocked_positions(grid, enemy, radius=0.7):
+    blocked = set()
+    # Dead enemies aren't in the index
+    for other in grid.enemy_index.query(enemy.row, enemy.column,
+                                        BLOCK_DISTANCE, ignore=enemy):
+        for row in range(math.ceil(other.row - radius),
+                         math.floor(other.row + radius) + 1):
+            for column in range(math.ceil(other.column - radius),
+                                math.floor(other.column + radius) + 1):
+                if (row - other.row) ** 2 + (column - other.column) ** 2 < \
+                        radius * radius:
+                    blocked.add((row, column))
+    return blocked
+
+
+# Takes path requests from enemies and solves them on a pool of workers
+class PathService:
+
+    def __init__(self, workers=2, use_processes=False):
+        self.use_processes = use_processes
+        if use_processes:
+            self.executor = ProcessPoolExecutor(workers)
+        else:
+            self.executor = ThreadPoolExecutor(workers)
+        # Futures of the unfinished requests by enemy
+        self.pending = {}
+        # The snapshot is shared until the passability changes
+        self.snapshot = None
+        self.snapshot_grid = None
+        self.snapshot_version = -1
+        # Numbers the snapshots for the worker processes, and whether the
+        # current one was sent with a request yet
+        self.snapshot_number = 0
+        self.snapshot_sent = False
+        # Metrics
+        self.request_count = 0
+        self.solved_count = 0
+        self.total_latency = 0
+        self.max_latency = 0
+        self.snapshots_sent = 0
+
+    # Returns a snapshot of the grid, making a new one if spikes changed
+    def get_snapshot(self, grid):
+        if self.snapshot_grid is not grid or \
+                self.snapshot_version != grid.passability_version:
+            self.snapshot = PassabilitySnapshot(grid)
+            self.snapshot_grid = grid
+            self.snapshot_version = grid.passability_version
+            self.snapshot_number += 1
+            self.snapshot_sent = False
+        return self.snapshot
+
+    # Forgets the snapshot, used when the passability version of a grid
+    # starts over and the version of the snapshot could be reused
+    def forget_snapshot(self):
+        self.snapshot = None
+        self.snapshot_grid = None
+
+    # Starts a search for an enemy unless one is already running
+    def request(self, grid, enemy, start_pos, end_pos):
+        if enemy in self.pending:
+            return
+        snapshot = self.get_snapshot(grid)
+        self.pending[enemy] = self.submit(
+            (get_blocked_positions(grid, enemy), start_pos, end_pos),
+            time.perf_counter(), not self.snapshot_sent)
+        self.request_count += 1
+
+    # Hands the blocked positions, start and end of a search to the workers,
+    # with the current snapshot if it has to be sent to a worker process
+    def submit(self, arguments, request_time, send_snapshot=False):
+        if self.use_processes:
+            if send_snapshot:
+                self.snapshot_sent = True
+                self.snapshots_sent += 1
+            future = self.executor.submit(
+                solve_in_process, self.snapshot_number,
+                self.snapshot if send_snapshot else None, *arguments)
+        else:
+            future = self.executor.submit(solve, self.snapshot, *arguments)
+        future.arguments = arguments
+        future.request_time = request_time
+        future.add_done_callback(PathService.stamp_finish_time)
+        return future
+
+    # Records when a search finished
+    @staticmethod
+    def stamp_finish_time(future):
+        future.finish_time = time.perf_counter()
+
+    # Checks if the enemy is waiting for a path
+    def is_pending(self, enemy):
+        return enemy in self.pending
+
+    # Returns (True, path) if the enemy's search has finished, with path
+    # being None if there is no path, or (False, None) if it is still running
+    def collect(self, enemy):
+        future = self.pending.get(enemy)
+        if future is None or not future.done():
+            return False, None
+        positions = future.result()
+        if positions == MISSING_SNAPSHOT:
+            # The worker process didn't have the snapshot, send it this time
+            self.pending[enemy] = self.submit(future.arguments,
+                                              future.request_time, True)
+            return False, None
+        del self.pending[enemy]
+        latency = getattr(future, "finish_time", time.perf_counter()) - \
+            future.request_time
+        self.solved_count += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        if positions is None:
+            return True, None
+        return True, pathfinding.path_from_positions(positions)
+
+    # Drops the requests of these enemies, their results are out of date
+    def forget(self, enemies):
+        for enemy in enemies:
+            future = self.pending.pop(enemy, None)
+            if future is not None:
+                future.cancel()
+
+    # Returns the queue depth and solve latency metrics
+    def get_metrics(self):
+        return {"queue_depth": len(self.pending),
+                "requests": self.request_count,
+                "solved": self.solved_count,
+                "mean_latency_ms": self.total_latency * 1000 /
+                max(self.solved_count, 1),
+                "max_latency_ms": self.max_latency * 1000,
+                "snapshots_sent": self.snapshots_sent}
+
+    # Stops the workers
+    def shutdown(self):
+        self.forget(list(self.pending))
+        self.executor.shutdown(wait=True)
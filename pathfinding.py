@@ -5,9 +5,17 @@ pathfinding.py
 A module that contains functions for path finding (for enemies). The grid is
 represented as a graph with empty tiles connected to one another.
 BFSNode is used by the breadth first search algorithm to store node data.
+a_star_search is the faster engine used by enemies, breadth_first_search is
+kept as a reference implementation for benchmarks. distance_field computes a
+shared flow field that lets every enemy step towards the player at once.
 """
 
+import heapq
+from collections import deque
 from functools import total_ordering
+# My own modules
+from tiles import TILE_SPIKES, TILE_SWITCH
+from profiler import Profiler
 
 
 # Implements a recursive merge sort (for use in BFS)
@@ -70,19 +78,18 @@ def binary_search(sorted_list, value):
 # Implements a method for determining whether a character can go there
 def can_pass_through(grid, position, enemy=None, avoid_spikes=False,
                      avoid_switches=False):
-    tile = grid.get_tile_at(*position)
-    if "wall" in tile.name:
-        return False
-    if "spikes" in tile.name and (tile.is_armed or avoid_spikes):
-        return False
-    if "switch" in tile.name and avoid_switches:
+    if not grid.is_passable(*position):
         return False
+    if avoid_spikes or avoid_switches:
+        kind = grid.get_kind_at(*position)
+        if kind == TILE_SPIKES and avoid_spikes:
+            return False
+        if kind == TILE_SWITCH and avoid_switches:
+            return False
     # Avoid other enemies
-    if enemy:
-        for e in grid.enemies:
-            if e is not enemy and not e.is_dead and \
-                    enemy.distance_to(e, position) < 0.7:
-                return False
+    if enemy and grid.enemy_index.is_occupied(position[0], position[1], 0.7,
+                                              ignore=enemy):
+        return False
     return True
 
 
@@ -91,6 +98,11 @@ def distance_between(a, b):
     return ((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2) ** 0.5
 
 
+# Find the number of grid steps between two positions (A* heuristic)
+def manhattan_distance(a, b):
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
 # A node class for Breadth First Search
 @total_ordering
 class BFSNode:
@@ -122,6 +134,7 @@ def breadth_first_search(grid, start_pos, end_pos, enemy=None):
     already_explored = []
     # A variable for the discovered path
     found_path = None
+    expanded = 0
 
     while len(queue) > 0:
 
@@ -140,6 +153,7 @@ def breadth_first_search(grid, start_pos, end_pos, enemy=None):
             # Add the location to the list at the specified position,
             # keeping the list sorted
             already_explored.insert(list_index, node.position)
+            expanded += 1
 
             for direction in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
 
@@ -163,6 +177,10 @@ def breadth_first_search(grid, start_pos, end_pos, enemy=None):
             # Re-sort the queue in order of increasing distance
             merge_sort(queue)
 
+    if Profiler.enabled:
+        Profiler.count("searches")
+        Profiler.count("nodes", expanded)
+
     # If no path is found, return None
     if found_path is None:
         return None
@@ -175,3 +193,156 @@ def breadth_first_search(grid, start_pos, end_pos, enemy=None):
 
     # Return a list of steps for the enemy to take
     return path
+
+
+# Implements A* search on the map with a binary heap as the open set
+# Returns the same list of BFSNode steps as breadth_first_search
+def a_star_search(grid, start_pos, end_pos, enemy=None):
+    return find_path(start_pos, end_pos,
+                     lambda position: can_pass_through(grid, position,
+                                                       enemy=enemy))
+
+
+# Returns the positions of an A* path that doesn't go around other enemies,
+# or None if there is no path
+def find_positions(grid, start_pos, end_pos):
+    path = find_path(start_pos, end_pos,
+                     lambda position: grid.is_passable(*position))
+    if path is None:
+        return None
+    return [node.position for node in path]
+
+
+# Implements the A* search between two positions, where is_passable tells
+# whether a position can be walked on. Used by a_star_search and for searches
+# on a copy of the map's passability
+def find_path(start_pos, end_pos, is_passable):
+    start_node = BFSNode(0, start_pos)
+    # Entries are (estimated total, insertion order, node), the order makes
+    # sure nodes themselves are never compared
+    open_heap = [(manhattan_distance(start_pos, end_pos), 0, start_node)]
+    push_count = 1
+    # Positions that were expanded or found impassable
+    closed = set()
+    # Best known distance to every discovered position
+    best_distance = {start_pos: 0}
+    found_path = None
+    expanded = 0
+
+    while open_heap:
+        node = heapq.heappop(open_heap)[2]
+
+        # If the destination was found, break from the loop
+        if node.position == end_pos:
+            found_path = node
+            break
+
+        # Skip stale heap entries
+        if node.position in closed:
+            continue
+        closed.add(node.position)
+        expanded += 1
+
+        new_distance = node.distance + 1
+        for direction in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+
+            new_position = direction[0] + node.position[0], \
+                           direction[1] + node.position[1]
+
+            # If the new position already explored or reached sooner, ignore it
+            if new_position in closed or \
+                    best_distance.get(new_position, new_distance + 1) \
+                    <= new_distance:
+                continue
+
+            # If the new position is impassible, ignore it
+            if not is_passable(new_position):
+                closed.add(new_position)
+                continue
+
+            best_distance[new_position] = new_distance
+            estimate = new_distance + manhattan_distance(new_position, end_pos)
+            heapq.heappush(open_heap, (estimate, push_count,
+                                       BFSNode(new_distance, new_position,
+                                               node)))
+            push_count += 1
+
+    if Profiler.enabled:
+        Profiler.count("searches")
+        Profiler.count("nodes", expanded)
+
+    # If no path is found, return None
+    if found_path is None:
+        return None
+
+    # Otherwise, retrace path and make a list of steps
+    path = []
+    while found_path is not None:
+        path.append(found_path)
+        found_path = found_path.previous_node
+    path.reverse()
+
+    # Return a list of steps for the enemy to take
+    return path
+
+
+# Turns a list of positions back into a path of BFSNodes
+def path_from_positions(positions):
+    path = []
+    for distance, position in enumerate(positions):
+        path.append(BFSNode(distance, position, path[-1] if path else None))
+    return path
+
+
+# Computes the number of steps from the origin to every reachable position
+# using a breadth first search outward from the origin, stopping at
+# max_distance steps if given. Other enemies are not taken into account, so
+# the same field can be shared by all of them
+def distance_field(grid, origin, max_distance=None):
+    field = {origin: 0}
+    queue = deque([origin])
+    while queue:
+        position = queue.popleft()
+        new_distance = field[position] + 1
+        if max_distance is not None and new_distance > max_distance:
+            break
+        for direction in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+            new_position = direction[0] + position[0], \
+                           direction[1] + position[1]
+            if new_position in field or \
+                    not can_pass_through(grid, new_position):
+                continue
+            field[new_position] = new_distance
+            queue.append(new_position)
+    if Profiler.enabled:
+        Profiler.count("searches")
+        Profiler.count("nodes", len(field))
+    return field
+
+
+# Picks the next step towards the origin of a distance field. Neighbours that
+# are closer to the origin are tried in order and ones blocked by other
+# enemies are skipped. Returns a path of BFSNodes like a_star_search
+def follow_distance_field(grid, field, start_pos, enemy=None):
+    distance = field.get(start_pos)
+    if distance is None:
+        return None
+    start_node = BFSNode(distance, start_pos)
+    if distance == 0:
+        return [start_node]
+
+    candidates = []
+    for direction in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+        new_position = direction[0] + start_pos[0], \
+                       direction[1] + start_pos[1]
+        new_distance = field.get(new_position)
+        if new_distance is not None and new_distance < distance:
+            candidates.append((new_distance, new_position))
+    candidates.sort()
+
+    # Other enemies are avoided here instead of when building the field
+    for new_distance, new_position in candidates:
+        if can_pass_through(grid, new_position, enemy=enemy):
+            return [start_node, BFSNode(new_distance, new_position,
+                                        start_node)]
+    return None
@@ -0,0 +1,107 @@
+"""
+Mykyta S.
+profiler.py
+
+A module that contains a profiler for finding out where the time of a frame
+goes. The game loop and the grid measure their sections (handling events,
+updating each type of entity, path searches, drawing, updating the display)
+and the path searches count how many nodes they expand. Every frame becomes
+one record that is kept for the on-screen overlay and can be written to a
+CSV or JSON lines file.
+
+When the profiler is disabled every measured section costs only a check of
+Profiler.enabled.
+"""
+
+import csv
+import json
+import time
+from collections import deque
+
+# Sections of a frame in the order they happen
+SECTIONS = ("events", "wait", "loading", "paths", "player", "boomerang",
+            "enemies", "collisions", "coins", "draw_grid", "draw_entities",
+            "scale", "text", "display")
+# Sections that are idle time rather than work, left out of the frame total
+IDLE_SECTIONS = ("wait",)
+# Things counted during a frame
+COUNTERS = ("steps", "searches", "nodes")
+
+
+# Collects the time spent in each section and the counters of every frame
+class Profiler:
+    enabled = False
+    # Seconds spent in each section and the counters of the current frame
+    times = {}
+    counts = {}
+    frame = 0
+    # Records of the latest frames for the overlay
+    history = deque(maxlen=60)
+    # The open export file and its CSV writer if it is a CSV file
+    export_file = None
+    csv_writer = None
+
+    # Adds the time since start to a section and returns the current time,
+    # which is where the next section starts
+    @staticmethod
+    def lap(section, start):
+        now = time.perf_counter()
+        Profiler.times[section] = Profiler.times.get(section, 0) + now - start
+        return now
+
+    # Adds to a counter of the current frame
+    @staticmethod
+    def count(counter, amount=1):
+        Profiler.counts[counter] = Profiler.counts.get(counter, 0) + amount
+
+    # Finishes the record of the current frame and starts the next one
+    @staticmethod
+    def end_frame():
+        record = {"frame": Profiler.frame,
+                  "total_ms": sum(seconds for section, seconds
+                                  in Profiler.times.items()
+                                  if section not in IDLE_SECTIONS) * 1000}
+        for section in SECTIONS:
+            record[section + "_ms"] = Profiler.times.get(section, 0) * 1000
+        for counter in COUNTERS:
+            record[counter] = Profiler.counts.get(counter, 0)
+        Profiler.history.append(record)
+        if Profiler.csv_writer is not None:
+            Profiler.csv_writer.writerow(record)
+        elif Profiler.export_file is not None:
+            Profiler.export_file.write(json.dumps(record) + "\n")
+        Profiler.times = {}
+        Profiler.counts = {}
+        Profiler.frame += 1
+
+    # Returns the average of every value of the records in the history
+    @staticmethod
+    def get_averages():
+        if len(Profiler.history) == 0:
+            return {}
+        return {key: sum(record[key] for record in Profiler.history) /
+                len(Profiler.history) for key in Profiler.history[0]
+                if key != "frame"}
+
+    # Starts writing a record of every frame to a file, as CSV if the name
+    # ends with .csv and as JSON lines otherwise
+    @staticmethod
+    def start_export(file_name):
+        Profiler.stop_export()
+        Profiler.export_file = open(file_name, "w", newline="")
+        if file_name.endswith(".csv"):
+            Profiler.csv_writer = csv.DictWriter(
+                Profiler.export_file,
+                ["frame", "total_ms"] + [section + "_ms"
+                                         for section in SECTIONS] +
+                list(COUNTERS))
+            Profiler.csv_writer.writeheader()
+        Profiler.enabled = True
+
+    # Closes the export file
+    @staticmethod
+    def stop_export():
+        if Profiler.export_file is not None:
+            Profiler.export_file.close()
+        Profiler.export_file = None
+        Profiler.csv_writer = None
@@ -0,0 +1,133 @@
+"""
+Mykyta S.
+replay.py
+
+A module for recording the player's key presses and playing them back. A
+recording stores every attempt at a level: the map, the seed of the random
+generator enemies use, every key event with the tick it was applied on and
+the time since the attempt started, and how the attempt ended.
+
+Replaying feeds the same key events to the player at the same ticks in a
+headless game at full speed. Since the simulation runs in fixed steps, the
+outcome is the same as when it was recorded, which makes recordings useful
+for checking that changes to the engine don't change gameplay.
+
+Usage: python replay.py recording.json
+"""
+
+import os
+import sys
+import json
+import time
+
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+import pygame
+
+# My own module
+import headless
+
+VERSION = 1
+
+
+# Collects the inputs of every attempt while playing and saves them
+class InputRecorder:
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.attempts = []
+        self.attempt = None
+        self.start_time = 0
+
+    # Starts recording a new attempt at a level
+    def start_attempt(self, map_name, seed):
+        self.attempt = {"map": map_name, "seed": seed, "inputs": [],
+                        "result": None}
+        self.attempts.append(self.attempt)
+        self.start_time = time.perf_counter()
+
+    # Records a key event that is applied before the update of this tick
+    def record_event(self, tick, event):
+        if self.attempt is None or \
+                event.type not in (pygame.KEYDOWN, pygame.KEYUP):
+            return
+        milliseconds = round((time.perf_counter() - self.start_time) * 1000)
+        self.attempt["inputs"].append([tick, milliseconds, event.type,
+                                       event.key])
+
+    # Saves how the attempt ended and writes the recording to the file
+    def finish_attempt(self, summary):
+        if self.attempt is None:
+            return
+        self.attempt["result"] = summary
+        self.attempt = None
+        self.save()
+
+    # Writes all attempts to the file
+    def save(self):
+        with open(self.file_name, "w") as file:
+            json.dump({"version": VERSION, "attempts": self.attempts}, file)
+
+
+# Reads the attempts of a recording file
+def load_recording(file_name):
+    with open(file_name) as file:
+        data = json.load(file)
+    if data.get("version") != VERSION:
+        raise ValueError(file_name + " has an unsupported version")
+    return data["attempts"]
+
+
+# Plays an attempt back in a headless game and returns the game
+def replay_attempt(attempt, use_flow_field=True):
+    game = headless.HeadlessGame(attempt["map"],
+                                 use_flow_field=use_flow_field,
+                                 seed=attempt["seed"])
+    inputs = attempt["inputs"]
+    # Play until the recorded end, or until the last input if it has none
+    if attempt["result"] is not None:
+        last_tick = attempt["result"]["ticks"]
+    else:
+        last_tick = inputs[-1][0] if inputs else 0
+    next_input = 0
+    while True:
+        while next_input < len(inputs) and \
+                inputs[next_input][0] <= game.tick:
+            game.apply_key_event(*inputs[next_input][2:])
+            next_input += 1
+        if game.tick >= last_tick:
+            break
+        game.step()
+    return game
+
+
+# Checks if a replayed game ended the same way as the recorded attempt
+def matches_recording(attempt, game):
+    if attempt["result"] is None:
+        return True
+    summary = game.grid.get_summary()
+    # JSON turns tuples into lists
+    summary["position"] = list(summary["position"])
+    return summary == attempt["result"]
+
+
+# Replays every attempt of a recording and prints whether they match
+def main(arguments):
+    if len(arguments) < 1:
+        print(__doc__.strip().splitlines()[-1])
+        return
+    all_match = True
+    for attempt in load_recording(arguments[0]):
+        start_time = time.perf_counter()
+        game = replay_attempt(attempt)
+        elapsed_time = time.perf_counter() - start_time
+        is_match = matches_recording(attempt, game)
+        all_match = all_match and is_match
+        print("%-16s %8d ticks %10.0f ticks/s  %s" % (
+            attempt["map"], game.tick, game.tick / max(elapsed_time, 1e-9),
+            "same" if is_match else "DIFFERENT"))
+    sys.exit(0 if all_match else 1)
+
+
+# Replays the recording on run
+if __name__ == "__main__":
+    main(sys.argv[1:])
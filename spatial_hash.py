@@ -0,0 +1,85 @@
+"""
+Mykyta S.
+spatial_hash.py
+
+A module that contains a uniform grid spatial index. Entities are put into
+square buckets based on their position, so looking for entities near a point
+only has to visit the few buckets around it instead of every entity.
+"""
+
+
+# Stores entities in buckets of cell_size by cell_size tiles
+class SpatialHash:
+
+    def __init__(self, cell_size=1):
+        self.cell_size = cell_size
+        # Lists of entities for every (bucket row, bucket column)
+        self.buckets = {}
+        # The bucket each entity is currently stored in
+        self.entity_keys = {}
+
+    # Returns the bucket that contains this position
+    def get_key(self, row, column):
+        return int(row // self.cell_size), int(column // self.cell_size)
+
+    # Adds an entity to the bucket of its current position
+    def insert(self, entity):
+        key = self.get_key(entity.row, entity.column)
+        self.entity_keys[entity] = key
+        self.buckets.setdefault(key, []).append(entity)
+
+    # Removes an entity if it is stored
+    def remove(self, entity):
+        key = self.entity_keys.pop(entity, None)
+        if key is None:
+            return
+        bucket = self.buckets[key]
+        bucket.remove(entity)
+        if len(bucket) == 0:
+            del self.buckets[key]
+
+    # Moves a stored entity to another bucket if its position has changed
+    def update(self, entity):
+        old_key = self.entity_keys.get(entity)
+        if old_key is None:
+            return
+        key = self.get_key(entity.row, entity.column)
+        if old_key == key:
+            return
+        bucket = self.buckets[old_key]
+        bucket.remove(entity)
+        if len(bucket) == 0:
+            del self.buckets[old_key]
+        self.entity_keys[entity] = key
+        self.buckets.setdefault(key, []).append(entity)
+
+    # Returns all entities closer than radius to the position
+    def query(self, row, column, radius, ignore=None):
+        found = []
+        radius_squared = radius * radius
+        first_row, first_column = self.get_key(row - radius, column - radius)
+        last_row, last_column = self.get_key(row + radius, column + radius)
+        for bucket_row in range(first_row, last_row + 1):
+            for bucket_column in range(first_column, last_column + 1):
+                for entity in self.buckets.get((bucket_row, bucket_column),
+                                               ()):
+                    if entity is not ignore and \
+                            (entity.row - row) ** 2 + \
+                            (entity.column - column) ** 2 < radius_squared:
+                        found.append(entity)
+        return found
+
+    # Checks if any entity other than ignore is closer than radius
+    def is_occupied(self, row, column, radius, ignore=None):
+        radius_squared = radius * radius
+        first_row, first_column = self.get_key(row - radius, column - radius)
+        last_row, last_column = self.get_key(row + radius, column + radius)
+        for bucket_row in range(first_row, last_row + 1):
+            for bucket_column in range(first_column, last_column + 1):
+                for entity in self.buckets.get((bucket_row, bucket_column),
+                                               ()):
+                    if entity is not ignore and \
+                            (entity.row - row) ** 2 + \
+                            (entity.column - column) ** 2 < radius_squared:
+                        return True
+        return False
@@ -0,0 +1,138 @@
+"""
+Mykyta S.
+sprite_registry.py
+
+A module that contains the registry all sprites are loaded through. Every
+image is read from disk only once, converted to the display format and the
+same surface is shared by every tile and entity that uses it. After warm_up
+all sprites live in a single atlas surface. Rotations by 90 degree steps are
+also made once per sprite so they never have to be done while drawing.
+Sprites can be scaled up when they are loaded, so that the game can be drawn
+straight to the screen instead of scaling up every frame.
+In headless mode no images are loaded and every sprite is None.
+"""
+
+import os
+import pygame
+
+
+# Loads sprites once and hands out shared surfaces
+class SpriteRegistry:
+    folder = "sprites"
+    # Surfaces by sprite name (file name without .png)
+    sprites = {}
+    # One surface that all the warmed up sprites are subsurfaces of
+    atlas = None
+    # Lists of the sprite rotated by 0, 90, 180 and 270 degrees by name
+    rotations = {}
+    # How many times an image was read from disk
+    load_count = 0
+    # Set when running without a display, then sprites are never loaded
+    headless = False
+    # How many screen pixels wide every sprite pixel is
+    scale = 1
+
+    # Returns the shared surface of a sprite, loading it if needed
+    @staticmethod
+    def get_sprite(name):
+        if SpriteRegistry.headless:
+            return None
+        sprite = SpriteRegistry.sprites.get(name)
+        if sprite is None:
+            sprite = SpriteRegistry.load_sprite(name)
+            SpriteRegistry.sprites[name] = sprite
+        return sprite
+
+    # Returns a list of shared surfaces for a list of sprite names
+    @staticmethod
+    def get_sprites(names):
+        return [SpriteRegistry.get_sprite(name) for name in names]
+
+    # Returns the sprite rotated counterclockwise by a multiple of 90 degrees
+    @staticmethod
+    def get_rotated_sprite(name, angle):
+        return SpriteRegistry.get_rotations(name)[(angle // 90) % 4]
+
+    # Returns the list of all four rotations of a sprite, making them if needed
+    @staticmethod
+    def get_rotations(name):
+        if SpriteRegistry.headless:
+            return [None] * 4
+        rotations = SpriteRegistry.rotations.get(name)
+        if rotations is None:
+            sprite = SpriteRegistry.get_sprite(name)
+            rotations = [sprite] + [pygame.transform.rotate(sprite, angle)
+                                    for angle in (90, 180, 270)]
+            SpriteRegistry.rotations[name] = rotations
+        return rotations
+
+    # Reads a sprite from disk, scales it and converts it if the display is
+    # ready
+    @staticmethod
+    def load_sprite(name):
+        sprite = pygame.image.load(os.path.join(SpriteRegistry.folder,
+                                                name + ".png"))
+        SpriteRegistry.load_count += 1
+        if SpriteRegistry.scale != 1:
+            sprite = pygame.transform.scale(
+                sprite, (sprite.get_width() * SpriteRegistry.scale,
+                         sprite.get_height() * SpriteRegistry.scale))
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert_alpha()
+        return sprite
+
+    # Loads every sprite in the folder and packs them into one atlas. Has to
+    # be called after the display mode is set, before any sprite is used
+    @staticmethod
+    def warm_up():
+        names = sorted(file_name.removesuffix(".png") for file_name in
+                       os.listdir(SpriteRegistry.folder)
+                       if file_name.endswith(".png"))
+        sprites = [SpriteRegistry.get_sprite(name) for name in names]
+        if len(sprites) == 0:
+            return
+        # Put the sprites next to each other in rows of up to 16
+        per_row = min(len(sprites), 16)
+        cell_width = max(sprite.get_width() for sprite in sprites)
+        cell_height = max(sprite.get_height() for sprite in sprites)
+        rows = (len(sprites) + per_row - 1) // per_row
+        atlas = pygame.Surface((per_row * cell_width, rows * cell_height),
+                               pygame.SRCALPHA)
+        if pygame.display.get_surface() is not None:
+            atlas = atlas.convert_alpha()
+        atlas.fill((0, 0, 0, 0))
+        for i, (name, sprite) in enumerate(zip(names, sprites)):
+            position = (i % per_row) * cell_width, (i // per_row) * cell_height
+            atlas.blit(sprite, position)
+            SpriteRegistry.sprites[name] = atlas.subsurface(
+                pygame.Rect(position, sprite.get_size()))
+        SpriteRegistry.atlas = atlas
+        # Prepare the rotations from the atlas sprites
+        SpriteRegistry.rotations = {}
+        for name in names:
+            SpriteRegistry.get_rotations(name)
+
+    # Returns the number of bytes of pixel data held by the registry
+    @staticmethod
+    def get_bytes_held():
+        total = 0
+        if SpriteRegistry.atlas is not None:
+            total += SpriteRegistry.atlas.get_width() * \
+                     SpriteRegistry.atlas.get_height() * \
+                     SpriteRegistry.atlas.get_bytesize()
+        surfaces = list(SpriteRegistry.sprites.values())
+        for rotations in SpriteRegistry.rotations.values():
+            surfaces += rotations[1:]
+        for sprite in surfaces:
+            # Subsurfaces share the atlas pixels
+            if sprite.get_parent() is None:
+                total += sprite.get_width() * sprite.get_height() * \
+                         sprite.get_bytesize()
+        return total
+
+    # Returns the load statistics of the registry
+    @staticmethod
+    def get_stats():
+        return {"loads": SpriteRegistry.load_count,
+                "sprites": len(SpriteRegistry.sprites),
+                "bytes": SpriteRegistry.get_bytes_held()}
@@ -0,0 +1,69 @@
+"""
+Mykyta S.
+test_flow_field.py
+
+Tests for enemies following the shared flow field towards the player.
+Run with python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+# My own modules
+import grid_world
+from directions import RIGHT
+from sprite_registry import SpriteRegistry
+
+
+# Writes a level of one long corridor with the player and an enemy in it and
+# returns the name of the file
+def write_corridor(folder, width, player_column, enemy_column):
+    corridor = [""] * width
+    corridor[0] = corridor[-1] = "wall"
+    corridor[player_column] = "player"
+    corridor[enemy_column] = "enemy"
+    file_name = os.path.join(folder, "corridor_map_data.csv")
+    with open(file_name, "w") as file:
+        file.write(",".join(["wall"] * width) + "\n")
+        file.write(",".join(corridor) + "\n")
+        file.write(",".join(["wall"] * width) + "\n")
+    return file_name
+
+
+# Checks when enemies following the flow field chase the player
+class FlowFieldChaseTest(unittest.TestCase):
+
+    # Loads levels without sprites into a temporary folder
+    def setUp(self):
+        SpriteRegistry.headless = True
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    # An enemy further from the player than the field reaches starts chasing
+    # once the player walks into range
+    def test_enemy_out_of_range_chases_later(self):
+        grid = grid_world.Grid(write_corridor(self.folder.name, 120, 1, 99),
+                               seed=0)
+        enemy = grid.enemies[0]
+        grid.update_entities(0.01)
+        self.assertIsNone(enemy.last_path)
+        grid.player.set_moving(RIGHT)
+        while enemy.column - grid.player.column > 40:
+            grid.update_entities(0.01)
+        grid.player.set_moving(None)
+        start_column = enemy.column
+        for _ in range(200):
+            grid.update_entities(0.01)
+        self.assertIsNotNone(enemy.last_path)
+        self.assertLess(enemy.column, start_column - 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
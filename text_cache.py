@@ -0,0 +1,44 @@
+"""
+Mykyta S.
+text_cache.py
+
+A module that contains a cache of rendered text. Rendering text with a font
+is slow compared to drawing a surface, and most text on the screen (the level
+name, the counters, Game Over) stays the same for many frames, so every
+rendered string is kept and reused until it hasn't been drawn for a while.
+"""
+
+from collections import OrderedDict
+
+import pygame
+
+
+# Keeps the surfaces of recently rendered strings, dropping the ones that
+# were used least recently when there are too many
+class TextCache:
+
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        # Surfaces by (font, string, colour), the most recent last
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # Returns the surface of a string, rendering it only if it isn't cached
+    def render(self, font: pygame.font.Font, string, colour=(255, 255, 255)):
+        key = font, string, colour
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = font.render(string, False, colour)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    # Removes every cached surface
+    def clear(self):
+        self.surfaces.clear()
@@ -12,24 +12,34 @@ PARENT CLASS    SUBCLASSES
 """
 
 import pygame
+# My own modules
+from sprite_registry import SpriteRegistry
+from directions import REVERSED, from_letter
+
+# Tile kinds stored by the grid in its tile kind map
+TILE_EMPTY = 0
+TILE_WALL = 1
+TILE_CORNER = 2
+TILE_SPIKES = 3
+TILE_SWITCH = 4
+TILE_EXIT = 5
 
 
 # A parent class that contains basic methods for drawing a tile
 class Tile:
-    wall_sprite = None
+    __slots__ = ("name", "kind", "is_active")
 
     # A basic wall tile
     def __init__(self, name="wall"):
         self.name = name
+        self.kind = TILE_EMPTY if name == "empty" else TILE_WALL
         # Can the tile interact with entities?
         self.is_active = False
 
-    # Loads the basic wall sprite
+    # Returns the basic wall sprite
     @staticmethod
     def get_wall_sprite():
-        if Tile.wall_sprite is None:
-            Tile.wall_sprite = pygame.image.load("sprites/wall.png")
-        return Tile.wall_sprite
+        return SpriteRegistry.get_sprite("wall")
 
     # Draws the tile
     def draw(self, surface: pygame.Surface, rect: pygame.Rect):
@@ -40,26 +50,35 @@ class Tile:
 
 # A class for the corners that turn the boomerang
 class Corner(Tile):
-    corner_sprites = None
+    __slots__ = ("sides", "bounces")
 
-    # Loads the sprites into memory
-    @staticmethod
-    def load_sprites():
-        if Corner.corner_sprites is not None:
-            return Corner.corner_sprites
-        Corner.corner_sprites = dict()
-        for name in ["cornerUL", "cornerDL", "cornerUR", "cornerDR"]:
-            Corner.corner_sprites[name] = pygame.image \
-                .load("sprites/" + name + ".png")
-        return Corner.corner_sprites
+    def __init__(self, name="cornerUL"):
+        super().__init__(name)
+        self.kind = TILE_CORNER
+        # The directions of the two sides that turn the boomerang
+        self.sides = tuple(from_letter(letter)
+                           for letter in name.removeprefix("corner"))
+        # The direction the boomerang leaves in for each direction it comes
+        # from, it turns if it comes to a turning side and reverses otherwise
+        self.bounces = tuple(REVERSED[self.get_other_side(direction)]
+                             if direction in self.sides
+                             else REVERSED[direction] for direction in range(4))
+
+    # Returns the turning side that isn't the given one
+    def get_other_side(self, side):
+        for other_side in self.sides:
+            if other_side != side:
+                return other_side
+        return side
 
     # Draws the tile
     def draw(self, surface: pygame.Surface, rect: pygame.Rect):
-        surface.blit(Corner.load_sprites()[self.name], rect)
+        surface.blit(SpriteRegistry.get_sprite(self.name), rect)
 
 
 # A method for active tiles
 class ActiveTile(Tile):
+    __slots__ = ("grid", "row", "column")
 
     def __init__(self, name="wall"):
         super().__init__(name)
@@ -73,10 +92,18 @@ class ActiveTile(Tile):
         self.column = column
         self.grid = grid
 
+    # Returns the part of the tile that changes during the game
+    def get_state(self):
+        return None
+
+    # Restores the state returned by get_state
+    def set_state(self, state):
+        pass
+
 
 # A class for the spikes
 class Spikes(ActiveTile):
-    sprites = None
+    __slots__ = ("is_armed",)
 
     # Initialize the spikes
     def __init__(self, name="spikes"):
@@ -85,20 +112,27 @@ class Spikes(ActiveTile):
             self.is_armed = False
             name = name.split(" ")[0]
         super().__init__(name)
+        self.kind = TILE_SPIKES
 
-    # Loads sprites for the spikes
+    # Returns sprites for the spikes
     @staticmethod
     def load_sprites():
-        if Spikes.sprites is None:
-            Spikes.sprites = []
-            for name in ["spikes", "spikes-hidden"]:
-                Spikes.sprites.append(pygame.image
-                                      .load("sprites/" + name + ".png"))
-        return Spikes.sprites
+        return SpriteRegistry.get_sprites(["spikes", "spikes-hidden"])
+
+    # Returns whether the spikes are armed
+    def get_state(self):
+        return self.is_armed
+
+    # Arms or disarms the spikes
+    def set_state(self, state):
+        if self.is_armed != state:
+            self.toggle()
 
     # Toggles the spikes
     def toggle(self):
         self.is_armed = not self.is_armed
+        self.grid.update_passability(self.row, self.column)
+        self.grid.dirty_tiles.add((self.row, self.column))
 
     # Draws the tile
     def draw(self, surface: pygame.Surface, rect: pygame.Rect):
@@ -109,33 +143,42 @@ class Spikes(ActiveTile):
 
 # A class for a switch
 class Switch(ActiveTile):
-    sprites = None
+    __slots__ = ("is_activated", "letter")
 
     def __init__(self, name="switch"):
         super().__init__(name)
+        self.kind = TILE_SWITCH
         self.is_activated = False
+        # Spikes with this letter in their name are toggled by the switch
+        self.letter = name.removeprefix("switch")
 
-    # Loads sprites for the spikes
+    # Returns sprites for the switch
     @staticmethod
     def load_sprites():
-        if Switch.sprites is None:
-            Switch.sprites = []
-            for name in ["switch-left", "switch-right"]:
-                Switch.sprites.append(pygame.image
-                                      .load("sprites/" + name + ".png"))
-        return Switch.sprites
+        return SpriteRegistry.get_sprites(["switch-left", "switch-right"])
+
+    # Returns whether the switch is activated
+    def get_state(self):
+        return self.is_activated
+
+    # Sets the switch without toggling any spikes
+    def set_state(self, state):
+        if self.is_activated != state:
+            self.is_activated = state
+            self.grid.dirty_tiles.add((self.row, self.column))
 
     # Toggles the switch
     def toggle(self):
         self.is_activated = not self.is_activated
-        # Switches spikes
-        letter = self.name.removeprefix("switch")
-        for tile in self.grid.active_tiles:
-            if "spikes" in tile.name:
-                if letter in tile.name.removeprefix("spikes"):
-                    tile.toggle()
-        for enemy in self.grid.enemies:
-            enemy.update_path(True)
+        self.grid.dirty_tiles.add((self.row, self.column))
+        # Switches spikes, the ones that aren't loaded yet start toggled
+        self.grid.switch_toggles[self.letter] = \
+            self.grid.switch_toggles.get(self.letter, 0) + 1
+        spikes_list = self.grid.spikes_by_letter.get(self.letter, [])
+        for spikes in spikes_list:
+            spikes.toggle()
+        # Only enemies whose paths are affected have to find new ones
+        self.grid.invalidate_paths(spikes_list)
 
     # Draws the switch
     def draw(self, surface: pygame.Surface, rect: pygame.Rect):
@@ -146,14 +189,16 @@ class Switch(ActiveTile):
 
 # A class for the exit
 class Exit(ActiveTile):
-    sprites = None
+    __slots__ = ()
+
+    def __init__(self, name="exit"):
+        super().__init__(name)
+        self.kind = TILE_EXIT
 
-    # Loads sprites for the exit
+    # Returns sprites for the exit
     @staticmethod
     def load_sprites():
-        if Exit.sprites is None:
-            Exit.sprites = [pygame.image.load("sprites/exit.png")]
-        return Exit.sprites
+        return SpriteRegistry.get_sprites(["exit"])
 
     # Get level from the name
     def get_next_level(self):